@@ -1,28 +1,67 @@
+import time
+IMPORT_STARTED = time.perf_counter()  # startup timing reported by create_app()
 import os
 import json
+import uuid
+import hmac
+import hashlib
 import random
 import requests
 import datetime
 from urllib.parse import unquote
-from flask import Flask, request, jsonify, session
+from flask import Flask, Request, Response, request, jsonify
 from flask_cors import CORS
-from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt_identity
+from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt_identity, verify_jwt_in_request
 from dotenv import load_dotenv
-from twelvelabs import TwelveLabs
-from twelvelabs.models.task import Task
 from pymongo import MongoClient
+from pymongo.errors import BulkWriteError
 from werkzeug.security import generate_password_hash, check_password_hash
 from bson.objectid import ObjectId
-import google.generativeai as genai 
-import speech_recognition as sr
-from moviepy.editor import VideoFileClip
 from datetime import timedelta
+from concurrent.futures import ThreadPoolExecutor, Future
 from flask_login import LoginManager, UserMixin
+from job_queue import JobQueue, InMemoryJobStore, MongoJobStore, JOB_QUEUED, JOB_DEFERRED, TERMINAL_STATUSES
+from pipeline import Pipeline
+from cache import TTLCache, SingleFlight, TieredCache, MongoCacheStore
+from llm import CachedLLM, MongoLLMStore
+from client_pool import KeyedClientPool, make_http_session
+from task_watcher import TaskWatcher, MongoTaskSignals
+from stats import UserStats
+from chat_context import ChatContext
+from resume_text import extract_resume_text, ExtractionError, SUPPORTED_EXTENSIONS
+from structured_output import extract_json, validate
+from job_match import JobDescription
+from transcription import ChunkedTranscriber
+from transcode import VideoNormalizer, TranscodeError
+from scratch import ScratchDir, UploadTooLarge, HashingFileWriter, sweep_stale
+from resumable_upload import ResumableUploads, UploadError
+from write_behind import WriteBehindBuffer
+from process_stats import rss_mb, peak_rss_mb
 
 load_dotenv()
 
 
+class UploadRequest(Request):
+    """Writes interview video parts straight into a job scratch dir while the body is parsed.
+
+    Werkzeug would otherwise spool each file part to its own temporary file
+    first, and only enforce MAX_CONTENT_LENGTH. Other endpoints keep the
+    default behaviour.
+    """
+    upload_scratch = None
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        if self.endpoint != 'upload':
+            return super()._get_file_stream(total_content_length, content_type, filename, content_length)
+        if self.upload_scratch is None:
+            self.upload_scratch = ScratchDir()
+        parts = len(os.listdir(self.upload_scratch.dir))
+        name = 'interview.mp4' if parts == 0 else f'part_{parts}'
+        return HashingFileWriter(self.upload_scratch.path(name), MAX_VIDEO_SIZE, hasher=hashlib.sha256())
+
+
 app = Flask(__name__)
+app.request_class = UploadRequest
 app.secret_key = os.getenv('SECRET_KEY')
 # Configure CORS to allow requests from React frontend
 CORS(app, resources={
@@ -38,19 +77,145 @@ app.config['JWT_SECRET_KEY'] = os.getenv('JWT_SECRET_KEY', 'your-secret-key')
 app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(days=1)
 jwt = JWTManager(app)
 
-# MongoDB setup
+# Upload limits: reject oversized bodies while they are being read, not after
+MAX_VIDEO_SIZE = 2 * 1024 * 1024 * 1024  # 2GB
+app.config['MAX_CONTENT_LENGTH'] = MAX_VIDEO_SIZE + 1024 * 1024  # allow for multipart overhead
+
+# Resumable uploads: the client sends the video in chunks that are stored on local disk
+resumable_uploads = ResumableUploads(
+    MAX_VIDEO_SIZE,
+    chunk_size=int(os.getenv('UPLOAD_CHUNK_SIZE', 8 * 1024 * 1024))
+)
+
+# MongoDB setup. connect=False defers connecting (and pymongo's monitor
+# threads) to the first query, which happens in the worker after fork
 mongo_uri = os.getenv("MONGO_URI")
-client = MongoClient(mongo_uri)
+client = MongoClient(mongo_uri, connect=False)
 db = client["ai-interview-analyzer"]
 users_collection = db["users"]
 results_collection = db["results"]
+user_stats = UserStats(db["user_stats"], results_collection)
+
+def write_results(_target, docs):
+    """Bulk-insert interview results and fold them into the stats rollups."""
+    try:
+        results_collection.insert_many(docs, ordered=False)
+    except BulkWriteError as e:
+        # A retried batch may already be partly stored; its duplicate _ids are fine
+        if any(error.get("code") != 11000 for error in e.details.get("writeErrors", [])):
+            raise
+    try:
+        user_stats.record_many([
+            (doc["email"], doc["question"], doc["results"], doc["_id"].generation_time) for doc in docs
+        ])
+    except Exception as e:
+        print(f"Error updating stats rollups: {e}")
+
+# Optionally take result writes off the job thread and batch them; flushed at shutdown
+results_buffer = WriteBehindBuffer(
+    write_results,
+    max_batch=int(os.getenv('RESULTS_WRITE_BATCH', 100)),
+    flush_interval=float(os.getenv('RESULTS_WRITE_INTERVAL', 2)),
+    name="results-writer"
+) if os.getenv('RESULTS_WRITE_BEHIND') else None
+
+def store_result(doc):
+    doc.setdefault("_id", ObjectId())
+    if results_buffer is not None:
+        results_buffer.add("results", doc)
+        return doc["_id"]
+    results_collection.insert_one(doc)
+    try:
+        user_stats.record(doc["email"], doc["question"], doc["results"], doc["_id"].generation_time)
+    except Exception as e:
+        print(f"Error updating stats rollup: {e}")
+    return doc["_id"]
+
+# Short-lived per-process cache of user documents; invalidated on every user write
+user_cache = TTLCache(
+    max_entries=int(os.getenv('USER_CACHE_SIZE', 4096)),
+    ttl_seconds=int(os.getenv('USER_CACHE_TTL', 30))
+)
+
+# Background workers for the video analysis pipeline. Job state lives in Mongo so
+# any worker process can answer status polls; JOB_STORE=memory is single-process only
+job_queue = JobQueue(
+    store=InMemoryJobStore() if os.getenv('JOB_STORE') == 'memory' else MongoJobStore(db["jobs"]),
+    max_workers=int(os.getenv('JOB_WORKERS', 4)),
+    retention_seconds=int(os.getenv('JOB_RETENTION', 60 * 60))
+)
+
+# Resume text extraction takes seconds, so it gets its own workers instead of
+# queueing behind multi-minute video jobs
+extraction_queue = JobQueue(
+    store=job_queue.store,
+    max_workers=int(os.getenv('EXTRACTION_WORKERS', 2)),
+    retention_seconds=int(os.getenv('JOB_RETENTION', 60 * 60))
+)
+
+# A batch job mostly waits on batch_pool futures, so batches get their own workers
+# rather than holding video pipeline workers while they wait
+batch_queue = JobQueue(
+    store=job_queue.store,
+    max_workers=int(os.getenv('BATCH_JOB_WORKERS', 2)),
+    retention_seconds=int(os.getenv('JOB_RETENTION', 60 * 60))
+)
 
 API_URL = os.getenv('API_URL')
 
 # Gemini AI setup
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-genai.configure(api_key=GEMINI_API_KEY)
-gemini_model = genai.GenerativeModel('gemini-2.0-flash')  # Initialize Gemini model
+GEMINI_MODEL_NAME = 'gemini-2.0-flash'
+
+def make_gemini_model():
+    # google.generativeai is heavy to import; only load it once a worker actually calls Gemini
+    import google.generativeai as genai
+    genai.configure(api_key=GEMINI_API_KEY)
+    return genai.GenerativeModel(GEMINI_MODEL_NAME)
+
+# All Gemini calls go through the cached client; repeat prompts skip the API.
+# Both tiers expire after LLM_CACHE_TTL
+LLM_CACHE_TTL = int(os.getenv('LLM_CACHE_TTL', 24 * 60 * 60))
+llm = CachedLLM(
+    model_factory=make_gemini_model,
+    model_name=GEMINI_MODEL_NAME,
+    cache=TTLCache(
+        max_entries=int(os.getenv('LLM_CACHE_SIZE', 512)),
+        ttl_seconds=LLM_CACHE_TTL
+    ),
+    store=MongoLLMStore(db["llm_cache"], ttl_seconds=LLM_CACHE_TTL) if os.getenv('LLM_CACHE_MONGO') else None
+)
+
+# Resume chat keeps turns in a capped collection and sends only a bounded window to Gemini
+chat_context = ChatContext(db, llm)
+
+# Finished analyses keyed by video content hash and Twelve Labs index, so re-uploads
+# of the same recording skip Twelve Labs, transcription and Gemini entirely. The
+# Mongo tier lets a retry that lands on another worker hit too
+ANALYSIS_CACHE_TTL = int(os.getenv('ANALYSIS_CACHE_TTL', 7 * 24 * 60 * 60))
+analysis_cache = TieredCache(
+    TTLCache(
+        max_entries=int(os.getenv('ANALYSIS_CACHE_SIZE', 256)),
+        ttl_seconds=ANALYSIS_CACHE_TTL
+    ),
+    store=MongoCacheStore(db["analysis_cache"], ttl_seconds=ANALYSIS_CACHE_TTL)
+    if os.getenv('ANALYSIS_CACHE_MONGO', '1') != '0' else None
+)
+
+# Speech-to-text: audio is streamed out of the video and recognized in parallel chunks
+transcriber = ChunkedTranscriber(
+    backend=os.getenv('TRANSCRIBE_BACKEND', 'google'),
+    max_workers=int(os.getenv('TRANSCRIBE_WORKERS', 4))
+)
+
+# Re-encode uploads to a capped resolution/fps/bitrate before sending them to
+# Twelve Labs; the same ffmpeg pass extracts the audio for transcription
+video_normalizer = VideoNormalizer(
+    max_height=int(os.getenv('TRANSCODE_MAX_HEIGHT', 720)),
+    max_fps=int(os.getenv('TRANSCODE_MAX_FPS', 30)),
+    max_kbps=int(os.getenv('TRANSCODE_MAX_KBPS', 1500)),
+    preset=os.getenv('TRANSCODE_PRESET', 'veryfast')
+) if os.getenv('TRANSCODE_UPLOADS', '1') != '0' else None
 
 print("Environment Variables:")
 print(f"API_URL exists: {'API_URL' in os.environ}")
@@ -63,7 +228,7 @@ login_manager.login_view = 'login'
 def load_user(user_id):
     # Load your user from the database based on user_id
     # Return None if the user doesn't exist
-    user = users_collection.find_one({'_id': ObjectId(user_id)})
+    user = get_user(user_id, 'email')
     if user:
         return User(user)
     return None
@@ -85,6 +250,54 @@ class User(UserMixin):
     def get_id(self):
         return self.id
 
+HISTORY_PAGE_SIZE = 20
+HISTORY_MAX_PAGE_SIZE = 100
+HISTORY_SUMMARY_PROJECTION = {"question": 1, "video_id": 1, "results": 1}
+
+def ensure_indexes():
+    """Create the indexes the hot query paths rely on. Safe to run on every boot."""
+    try:
+        results_collection.create_index([("email", 1), ("question", 1), ("_id", -1)])
+        db.resumes.create_index([("resume_id", 1), ("user_id", 1)])
+        chat_context.ensure_collection()
+        if llm.store is not None:
+            llm.store.ensure_index()
+    except Exception as e:
+        print(f"Error creating indexes: {e}")
+
+# Fields that rarely change and may be served from the per-process user_cache. Everything
+# else (asked_questions, current_question, ...) changes per question and is always read
+# from Mongo, since another worker may have written it since this one cached the user
+CACHEABLE_USER_FIELDS = {'_id', 'email', 'api_key', 'index_id', 'role'}
+
+def get_user(user_id, *fields):
+    """Fetch a user by ID with only `fields` projected.
+
+    Fields in CACHEABLE_USER_FIELDS are served from user_cache when possible;
+    the rest always come from Mongo. Fields missing from the stored document
+    come back as None. Returns a copy, or None if the user does not exist.
+    """
+    cached = user_cache.get(user_id)
+    missing = [f for f in fields if cached is None or f not in CACHEABLE_USER_FIELDS or f not in cached]
+    if cached is not None and not missing:
+        return {f: cached[f] for f in ('_id', *fields)}
+
+    projection = {field: 1 for field in missing} or {'_id': 1}
+    user = users_collection.find_one({'_id': ObjectId(user_id)}, projection)
+    if not user:
+        return None
+    for field in missing:
+        user.setdefault(field, None)
+
+    cacheable = {f: v for f, v in user.items() if f in CACHEABLE_USER_FIELDS}
+    if cached is not None:
+        cacheable = {**cached, **cacheable}
+    user_cache.set(user_id, cacheable)
+    return {**cacheable, **user}
+
+def invalidate_user(user_id):
+    user_cache.delete(user_id)
+
 INTERVIEW_QUESTIONS = [
     "Tell me about yourself.",
     "What are your greatest strengths",
@@ -97,101 +310,163 @@ INTERVIEW_QUESTIONS = [
     "What's your leadership style"
 ]
 
-def check_api_connection(api_key):
+# Bump when TWELVELABS_PROMPT or the Gemini feedback prompt changes so cached analyses are not reused
+ANALYSIS_PROMPT_VERSION = "1"
+GEMINI_ANALYSIS_FAILED = "Gemini analysis failed."
+
+INTERVIEW_SCORE_SCHEMA = {
+    "confidence": ("number", 0),
+    "clarity": ("number", 0),
+    "speech_rate": ("number", 0),
+    "eye_contact": ("number", 0),
+    "body_language": ("number", 0),
+    "voice_tone": ("number", 0),
+    "imp_points": ("list", list)
+}
+
+RESUME_ANALYSIS_BASE_SCHEMA = {
+    "score": ("number", 70),
+    "summary": ("string", ""),
+    "strengths": ("list", list),
+    "improvements": ("list", list),
+    "keywords": ("list", list),
+    "improved_resume": ("string", "")
+}
+RESUME_ANALYSIS_SCHEMA = dict(RESUME_ANALYSIS_BASE_SCHEMA, job_match=({
+    "score": ("number", 0),
+    "summary": ("string", ""),
+    "missing_keywords": ("list", list),
+    "recommendations": ("list", list)
+}, dict))
+
+TWELVELABS_PROMPT = """You're an Interviewer, Analyze the video clip of the interview answer.
+        Rules for scoring:
+        - If **no face is detected**, give **less than 5** for all categories.
+        - If **no voice is detected**, set `"clarity"`, `"speech_rate"`, `"voice_tone"` to **1** and add `"No speech detected"` to `"imp_points"`.
+        - If **both face and voice are missing**, return the following JSON:
+        ```json
+        {
+            "error": "No valid face or speech detected in the video."
+        }
+
+        Otherwise provide the response in the following JSON format with numerical values from 1-10:
+        {
+            "confidence": <number>,
+            "clarity": <number>,
+            "speech_rate": <number>,
+            "eye_contact": <number>,
+            "body_language": <number>,
+            "voice_tone": <number>,
+            "imp_points": [<list of important points as strings>]
+        }"""
+
+# Credential checks: (connect, read) timeouts, and how long definitive answers are reused
+CREDENTIAL_CHECK_TIMEOUT = (3.05, 10)
+CREDENTIAL_VALID_TTL = int(os.getenv('CREDENTIAL_VALID_TTL', 10 * 60))
+CREDENTIAL_INVALID_TTL = int(os.getenv('CREDENTIAL_INVALID_TTL', 60))
+
+# Long-lived HTTP sessions and Twelve Labs SDK clients, reused per API key
+CLIENT_POOL_SIZE = int(os.getenv('CLIENT_POOL_SIZE', 32))
+http_sessions = KeyedClientPool(make_http_session, max_size=CLIENT_POOL_SIZE)
+def make_twelvelabs_client(api_key):
+    from twelvelabs import TwelveLabs
+    return TwelveLabs(api_key=api_key)
+
+twelvelabs_clients = KeyedClientPool(make_twelvelabs_client, max_size=CLIENT_POOL_SIZE)
+
+# One poller thread waits on every in-flight indexing task with adaptive backoff;
+# the Twelve Labs webhook (if configured) short-circuits the wait. A webhook that
+# reaches another worker process is passed on through the task_signals collection
+task_watcher = TaskWatcher(
+    min_interval=float(os.getenv('TASK_POLL_MIN_INTERVAL', 1)),
+    max_interval=float(os.getenv('TASK_POLL_MAX_INTERVAL', 15)),
+    signals=MongoTaskSignals(db["task_signals"])
+)
+INDEXING_TIMEOUT = int(os.getenv('INDEXING_TIMEOUT', 60 * 60))
+TWELVELABS_WEBHOOK_SECRET = os.getenv('TWELVELABS_WEBHOOK_SECRET')
+
+credential_cache = TTLCache(max_entries=1024, ttl_seconds=CREDENTIAL_VALID_TTL)
+credential_flight = SingleFlight()
+
+def fetch_api_connection(api_key):
+    """Live API key check. Returns (ok, error, cacheable); transient failures are not cacheable."""
     try:
         api_url = "https://api.twelvelabs.io/v1.3/tasks"
-        response = requests.get(
+        response = http_sessions.get(api_key).get(
             api_url,
-            headers={
-                "x-api-key": api_key,
-                "Accept": "application/json"
-            },
-            timeout=10  # Set timeout to 10 seconds
+            timeout=CREDENTIAL_CHECK_TIMEOUT
         )
         
         if response.status_code == 200:
-            return True, None
+            return True, None, True
         elif response.status_code in [401, 403]:
-            return False, "Invalid API key"
+            return False, "Invalid API key", True
         else:
-            return False, f"API key check failed with status code: {response.status_code}"
+            return False, f"API key check failed with status code: {response.status_code}", False
             
     except requests.Timeout:
-        return False, "API connection timed out. Please try again."
+        return False, "API connection timed out. Please try again.", False
     except requests.ConnectionError:
-        return False, "Could not connect to API. Please check your internet connection."
+        return False, "Could not connect to API. Please check your internet connection.", False
     except requests.RequestException as e:
-        return False, f"API connection check failed: {str(e)}"
+        return False, f"API connection check failed: {str(e)}", False
 
+def cached_credential_check(kind, api_key, index_id, fetch):
+    """Serve a credential check from cache, coalescing concurrent misses for the same key."""
+    key_hash = hashlib.sha256(api_key.encode("utf-8")).hexdigest()
+    cache_key = (kind, key_hash, index_id)
 
-def get_transcript(video_file_path):
-    recognizer = sr.Recognizer()
-    audio_path = "temp_audio.wav"
-    
-    try:
-        # Use 'with' to ensure the video file is closed after use
-        with VideoFileClip(video_file_path) as video:
-            video.audio.write_audiofile(audio_path, codec='pcm_s16le')
+    cached = credential_cache.get(cache_key)
+    if cached is not None:
+        return cached
 
-        with sr.AudioFile(audio_path) as source:
-            audio = recognizer.record(source)
+    def run_check():
+        ok, error, cacheable = fetch()
+        if cacheable:
+            ttl = CREDENTIAL_VALID_TTL if ok else CREDENTIAL_INVALID_TTL
+            credential_cache.set(cache_key, (ok, error), ttl_seconds=ttl)
+        return ok, error
 
-        transcript = recognizer.recognize_google(audio)
-        return transcript
+    return credential_flight.do(cache_key, run_check)
 
-    except Exception as e:
-        print(f"Error extracting transcript: {e}")
-        return ""
+def check_api_connection(api_key):
+    return cached_credential_check("api_key", api_key, None, lambda: fetch_api_connection(api_key))
 
-    finally:
-        # Clean up the audio file regardless of success or failure
-        if os.path.exists(audio_path):
-            try:
-                os.remove(audio_path)
-            except Exception as cleanup_error:
-                print(f"Error cleaning up audio file: {cleanup_error}")
+
+def get_transcript(video_file_path, pcm_path=None):
+    """Return (text, complete); complete is False if some audio chunks could not be recognized."""
+    # A TranscriptionError fails the job: an STT outage must not read as a silent answer
+    result = transcriber.transcribe(video_file_path, pcm_path=pcm_path)
+    return result["text"], not result["failed_chunks"]
 
 def process_api_response(data):
-    processed_data = {
-        "confidence": 0,
-        "clarity": 0,
-        "speech_rate": 0,
-        "eye_contact": 0,
-        "body_language": 0,
-        "voice_tone": 0,
-        "imp_points": []
-    }
-    
-    try:
-        if isinstance(data, str):
-
-            try:
-                import re
-                json_match = re.search(r'\{[\s\S]*\}', data)
-                if json_match:
-                    data = json.loads(json_match.group())
-                else:
-                    data = json.loads(data)
-            except json.JSONDecodeError as e:
-                print(f"JSON parsing error: {e}")
-                print(f"Raw data: {data}")
-                return processed_data
-        
-        if isinstance(data, dict):
-            for key in processed_data.keys():
-                if key in data:
-                    if isinstance(data[key], (int, float)):
-                        processed_data[key] = data[key]
-                    elif isinstance(data[key], str) and data[key].replace('.', '').isdigit():
-                        processed_data[key] = float(data[key])
-                    elif key == 'imp_points' and isinstance(data[key], list):
-                        processed_data[key] = data[key]
-                        
-    except Exception as e:
-        print(f"Error processing response: {e}")
-        print(f"Raw data: {data}")
-    
-    return processed_data
+    """Return (scores, complete); complete is False if any score had to fall back to its default."""
+    if isinstance(data, str):
+        parsed, _, _ = extract_json(data)
+        if parsed is None:
+            print("JSON parsing error: no JSON object in response")
+            print(f"Raw data: {data}")
+        data = parsed
+
+    processed_data, errors = validate(data or {}, INTERVIEW_SCORE_SCHEMA)
+    if errors and data:
+        print(f"Invalid fields in API response: {errors}")
+    return {key: processed_data[key] for key in INTERVIEW_SCORE_SCHEMA}, not errors
+
+@app.errorhandler(413)
+@app.errorhandler(UploadTooLarge)
+def request_too_large(e):
+    return jsonify({"error": "Uploaded file exceeds the 2GB limit"}), 413
+
+@app.teardown_request
+def cleanup_upload_scratch(exc):
+    # Set when an upload was streamed to disk but never handed to a job
+    if request.upload_scratch is not None:
+        request.upload_scratch.cleanup()
+
+@app.errorhandler(UploadError)
+def upload_error(e):
+    return jsonify({"error": str(e)}), e.status
 
 @app.route('/api/auth/login', methods=['POST'])
 def login():
@@ -217,7 +492,7 @@ def login():
 @jwt_required()
 def validate_token():
     current_user_id = get_jwt_identity()
-    user_data = users_collection.find_one({"_id": ObjectId(current_user_id)})
+    user_data = get_user(current_user_id, 'email', 'api_key', 'index_id', 'role')
     if user_data:
         return jsonify({
             'valid': True,
@@ -225,23 +500,25 @@ def validate_token():
                 'email': user_data['email'],
                 'api_key': user_data['api_key'],
                 'index_id': user_data['index_id'],
-                'role': user_data.get('role', 'user')
+                'role': user_data['role'] or 'user'
             }
         })
     return jsonify({'valid': False}), 401
 
-def check_index_id(api_key, index_id):
+def fetch_index_id(api_key, index_id):
+    """Live index ID check. Returns (ok, error, cacheable); transient failures are not cacheable."""
     try:
         api_url = f"https://api.twelvelabs.io/v1.3/indexes/{index_id}"
-        response = requests.get(api_url, headers={
-            "x-api-key": api_key,
-            "Accept": "application/json"
-        })
+        response = http_sessions.get(api_key).get(api_url, timeout=CREDENTIAL_CHECK_TIMEOUT)
         if response.status_code != 200:
-            return False, f"Index ID check failed with status code: {response.status_code}"
-        return True, None
+            cacheable = response.status_code in [400, 401, 403, 404]
+            return False, f"Index ID check failed with status code: {response.status_code}", cacheable
+        return True, None, True
     except requests.RequestException as e:
-        return False, f"Index ID connection check failed. Detailed error: {str(e)}"
+        return False, f"Index ID connection check failed. Detailed error: {str(e)}", False
+
+def check_index_id(api_key, index_id):
+    return cached_credential_check("index_id", api_key, index_id, lambda: fetch_index_id(api_key, index_id))
 
 @app.route('/api/auth/register', methods=['POST'])
 def register():
@@ -260,7 +537,7 @@ def register():
             return jsonify({'error': 'All fields are required'}), 400
 
         # Check if email already exists
-        if users_collection.find_one({"email": email}):
+        if users_collection.find_one({"email": email}, {"_id": 1}):
             return jsonify({'error': 'Email already registered'}), 400
 
         # Check API connection with timeout
@@ -299,12 +576,12 @@ def register():
 @jwt_required()
 def get_question():
     user_id = get_jwt_identity()
-    user = users_collection.find_one({'_id': ObjectId(user_id)})
+    user = get_user(user_id, 'asked_questions')
     if not user:
         return jsonify({'error': 'User not found'}), 404
 
     # Get user's asked questions from database
-    asked_questions = user.get('asked_questions', [])
+    asked_questions = user['asked_questions'] or []
     available_questions = [q for q in INTERVIEW_QUESTIONS if q not in asked_questions]
 
     if not available_questions:
@@ -320,6 +597,7 @@ def get_question():
             '$set': {'current_question': question}
         }
     )
+    invalidate_user(user_id)
     
     return jsonify({"question": question})
 
@@ -328,106 +606,419 @@ def get_question():
 @jwt_required()
 def upload():
     user_id = get_jwt_identity()
-    user = users_collection.find_one({'_id': ObjectId(user_id)})
+    user = get_user(user_id, 'api_key', 'index_id', 'email', 'current_question')
     if not user:
         return jsonify({'error': 'User not found'}), 404
         
     api_key = user['api_key']
     index_id = user['index_id']
     email = user['email']
+    question = user['current_question'] or request.form.get('question')
 
-    if not check_api_connection(api_key):
-        return jsonify({"error": "Failed to connect to the Twelve Labs API."}), 500
+    api_result, api_error = check_api_connection(api_key)
+    if not api_result:
+        return jsonify({"error": api_error or "Failed to connect to the Twelve Labs API."}), 500
     if 'video' not in request.files:
         return jsonify({"error": "No video file provided"}), 400
     video = request.files['video']
     if video.filename == '':
         return jsonify({"error": "No video file selected"}), 400
 
-    video_path = os.path.join('uploads', 'interview.mp4')
-    video.save(video_path)
+    # UploadRequest already wrote the part to its scratch dir and hashed it while reading the body
+    writer = video.stream
+    writer.close()
+
+    # Hand the video off to a background worker so this request returns immediately.
+    # From here on the job owns the scratch directory and removes it when done.
+    try:
+        job_id = job_queue.submit(
+            run_interview_pipeline,
+            api_key, index_id, email, question, writer.path, request.upload_scratch, writer.hasher.hexdigest(),
+            owner=user_id
+        )
+    except Exception as e:
+        return jsonify({"error": f"Error queueing video: {str(e)}"}), 500
+    request.upload_scratch = None
+
+    return jsonify({"job_id": job_id, "status": JOB_QUEUED}), 202
+
+@app.route('/api/uploads', methods=['POST'])
+@jwt_required()
+def create_upload():
+    """Start a resumable upload: {"size": <bytes>, "chunk_size": <optional bytes>}.
+
+    The client then PUTs each chunk to /api/uploads/<id>?offset=<byte offset>
+    with its SHA-256 hex digest in X-Chunk-SHA256, and POSTs to
+    /api/uploads/<id>/finalize once all are in. GET /api/uploads/<id> lists
+    the offsets still missing, so an interrupted upload can pick up where
+    it left off.
+    """
+    user_id = get_jwt_identity()
+    user = get_user(user_id, 'api_key', 'current_question')
+    if not user:
+        return jsonify({'error': 'User not found'}), 404
+    data = request.get_json(silent=True) or {}
+
+    api_result, api_error = check_api_connection(user['api_key'])
+    if not api_result:
+        return jsonify({"error": api_error or "Failed to connect to the Twelve Labs API."}), 500
+
+    manifest = resumable_uploads.create(
+        user_id,
+        data.get('size'),
+        chunk_size=data.get('chunk_size'),
+        metadata={'question': user['current_question'] or data.get('question')}
+    )
+    return jsonify(resumable_uploads.status(manifest)), 201
+
+@app.route('/api/uploads/<upload_id>', methods=['GET'])
+@jwt_required()
+def upload_status(upload_id):
+    manifest = resumable_uploads.get(upload_id, get_jwt_identity())
+    return jsonify(resumable_uploads.status(manifest))
+
+@app.route('/api/uploads/<upload_id>', methods=['PUT'])
+@jwt_required()
+def upload_chunk(upload_id):
+    offset = request.args.get('offset', type=int)
+    if offset is None:
+        return jsonify({"error": "offset query parameter is required"}), 400
+    manifest = resumable_uploads.get(upload_id, get_jwt_identity())
+    status = resumable_uploads.write_chunk(manifest, offset, request.stream, request.headers.get('X-Chunk-SHA256'))
+    return jsonify(status)
+
+@app.route('/api/uploads/<upload_id>/finalize', methods=['POST'])
+@jwt_required()
+def finalize_upload(upload_id):
+    """Queue analysis of a completed upload. An optional {"sha256": ...} is checked against the whole file."""
+    user_id = get_jwt_identity()
+    user = get_user(user_id, 'api_key', 'index_id', 'email')
+    if not user:
+        return jsonify({'error': 'User not found'}), 404
+    manifest = resumable_uploads.get(upload_id, user_id)
+    data = request.get_json(silent=True) or {}
+
+    scratch = resumable_uploads.finalize(manifest)
+    try:
+        job_id = job_queue.submit(
+            run_uploaded_interview,
+            user['api_key'], user['index_id'], user['email'], manifest['metadata'].get('question'),
+            manifest, scratch, data.get('sha256'),
+            owner=user_id
+        )
+    except Exception as e:
+        scratch.cleanup()
+        return jsonify({"error": f"Error queueing video: {str(e)}"}), 500
+
+    return jsonify({"job_id": job_id, "status": JOB_QUEUED}), 202
+
+def run_uploaded_interview(job_id, api_key, index_id, email, question, manifest, scratch, expected_sha256=None):
+    """Join a finalized resumable upload's chunks into one video, then run the interview pipeline on it."""
+    try:
+        video_path = scratch.path('interview.mp4')
+        video_hash = hashlib.sha256()
+        resumable_uploads.assemble(manifest, video_path, hasher=video_hash)
+        if expected_sha256 and video_hash.hexdigest() != expected_sha256.strip().lower():
+            raise UploadError("Checksum mismatch for the assembled video", status=422)
+    except Exception:
+        scratch.cleanup()
+        raise
+    return run_interview_pipeline(job_id, api_key, index_id, email, question, video_path, scratch, video_hash.hexdigest())
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+@jwt_required()
+def get_job(job_id):
+    user_id = get_jwt_identity()
+    job = job_queue.get(job_id)
+    if not job or job['owner'] != user_id:
+        return jsonify({'error': 'Job not found'}), 404
+
+    return jsonify({
+        'job_id': job['id'],
+        'status': job['status'],
+        'result': job['result'],
+        'error': job['error'],
+        'created_at': job['created_at'],
+        'finished_at': job['finished_at']
+    })
+
+def analysis_cache_key(video_hash, index_id, question):
+    # video_id is only meaningful inside the index it was uploaded to, so the index is part of the key
+    question_hash = hashlib.sha256((question or "").encode("utf-8")).hexdigest()
+    return f"{video_hash}:{index_id}:{ANALYSIS_PROMPT_VERSION}:{question_hash}"
+
+@app.route('/api/webhooks/twelvelabs', methods=['POST'])
+def twelvelabs_webhook():
+    """Indexing-task webhook from Twelve Labs. Only used to trigger an immediate re-poll."""
+    if not TWELVELABS_WEBHOOK_SECRET:
+        return jsonify({'error': 'Webhook not configured'}), 404
+
+    # TL-Signature: t=<timestamp>,v1=<hex HMAC-SHA256 of "<timestamp>.<body>">
+    body = request.get_data(as_text=True)
+    parts = dict(
+        part.split('=', 1) for part in request.headers.get('TL-Signature', '').split(',') if '=' in part
+    )
+    expected = hmac.new(
+        TWELVELABS_WEBHOOK_SECRET.encode('utf-8'),
+        f"{parts.get('t', '')}.{body}".encode('utf-8'),
+        hashlib.sha256
+    ).hexdigest()
+    if not hmac.compare_digest(expected, parts.get('v1', '')):
+        return jsonify({'error': 'Invalid signature'}), 401
+
+    data = request.get_json(silent=True) or {}
+    task_id = (data.get('data') or {}).get('id')
+    if task_id:
+        task_watcher.notify(task_id)
+    return jsonify({'received': True}), 200
+
+@app.route('/api/metrics', methods=['GET'])
+@jwt_required()
+def get_metrics():
+    return jsonify({
+        'analysis_cache': analysis_cache.stats(),
+        'llm_cache': llm.stats(),
+        'credential_cache': credential_cache.stats(),
+        'http_sessions': http_sessions.stats(),
+        'twelvelabs_clients': twelvelabs_clients.stats(),
+        'task_watcher': task_watcher.stats(),
+        'user_cache': user_cache.stats(),
+        'startup': startup_stats,
+        'results_writer': results_buffer.stats() if results_buffer is not None else None
+    })
+
+# A progress stream holds a request worker while it is open, so it is closed after
+# this long; the browser reconnects with Last-Event-ID and picks up where it left off
+JOB_EVENTS_MAX_SECONDS = int(os.getenv('JOB_EVENTS_MAX_SECONDS', 30))
+# EventSource can't send an Authorization header, so the stream also accepts a
+# token scoped to one job and its owner in the query string
+JOB_EVENTS_TOKEN_TTL = int(os.getenv('JOB_EVENTS_TOKEN_TTL', 60 * 60))
+
+def job_events_signature(job_id, user_id, expires_at):
+    payload = f"job-events:{job_id}:{user_id}:{expires_at}"
+    return hmac.new(app.config['JWT_SECRET_KEY'].encode('utf-8'), payload.encode('utf-8'), hashlib.sha256).hexdigest()
 
-    file_size = os.path.getsize(video_path)
-    if file_size > 2 * 1024 * 1024 * 1024:
-        return jsonify({"error": "Video file size exceeds 2GB limit"}), 400
+def make_job_events_token(job_id, user_id):
+    expires_at = int(time.time()) + JOB_EVENTS_TOKEN_TTL
+    return f"{user_id}.{expires_at}.{job_events_signature(job_id, user_id, expires_at)}"
+
+def read_job_events_token(job_id, token):
+    """Return the user ID a job events token was issued to, or None if it is invalid or expired."""
+    try:
+        user_id, expires_at, signature = token.rsplit('.', 2)
+        expires_at = int(expires_at)
+    except ValueError:
+        return None
+    if expires_at < time.time():
+        return None
+    if not hmac.compare_digest(signature, job_events_signature(job_id, user_id, expires_at)):
+        return None
+    return user_id
+
+@app.route('/api/jobs/<job_id>/events/token', methods=['POST'])
+@jwt_required()
+def job_events_token(job_id):
+    """Issue a token for opening the job's event stream with EventSource.
+
+    Usage: new EventSource(`/api/jobs/${jobId}/events?token=${token}`). The
+    token only works for this job's stream and expires after
+    JOB_EVENTS_TOKEN_TTL seconds.
+    """
+    user_id = get_jwt_identity()
+    job = job_queue.get(job_id)
+    if not job or job['owner'] != user_id:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify({'token': make_job_events_token(job_id, user_id), 'expires_in': JOB_EVENTS_TOKEN_TTL})
+
+@app.route('/api/jobs/<job_id>/events', methods=['GET'])
+def job_events(job_id):
+    """Server-sent events with the job's pipeline progress.
+
+    Authenticated either with the usual Authorization header or with a
+    ?token= from POST /api/jobs/<job_id>/events/token, since EventSource
+    can't set headers. Ends when the job finishes or after
+    JOB_EVENTS_MAX_SECONDS, whichever comes first. Run gunicorn with a
+    threaded or async worker class (gthread/gevent) so open streams don't
+    tie up a whole worker process.
+    """
+    token = request.args.get('token')
+    if token:
+        user_id = read_job_events_token(job_id, token)
+        if user_id is None:
+            return jsonify({'error': 'Invalid or expired stream token'}), 401
+    else:
+        verify_jwt_in_request()
+        user_id = get_jwt_identity()
+    job = job_queue.get(job_id)
+    if not job or job['owner'] != user_id:
+        return jsonify({'error': 'Job not found'}), 404
 
+    # Reconnecting clients resume after the last event they saw
     try:
-        client = TwelveLabs(api_key=api_key)
+        after = int(request.headers.get('Last-Event-ID', 0))
+    except ValueError:
+        after = 0
+    # Nothing left to send: 204 stops EventSource from reconnecting
+    if job['status'] in TERMINAL_STATUSES and not job_queue.store.events_since(job_id, after):
+        return '', 204
+
+    def stream():
+        # Tell EventSource to reconnect quickly when we close a long-running stream
+        yield "retry: 1000\n\n"
+        for event in job_queue.events(job_id, after=after, timeout=JOB_EVENTS_MAX_SECONDS):
+            if event is None:
+                yield ": keep-alive\n\n"
+                continue
+            yield f"id: {event['seq']}\nevent: {event['stage']}\ndata: {json.dumps(event)}\n\n"
+
+    return Response(stream(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+def run_interview_pipeline(job_id, api_key, index_id, email, question, video_path, scratch, video_hash):
+    """Index, analyze and store one interview video. Runs on a job_queue worker.
+
+    The worker is only held for local work: transcoding, the upload to
+    Twelve Labs and the transcript/Gemini branch. While Twelve Labs indexes,
+    the task watcher holds the job; the scoring step is resumed on a worker
+    once indexing ends.
+    """
+    pipeline = Pipeline()
+    media = {"video_path": video_path, "pcm_path": None}
+    indexed = Future()
+
+    def normalize_video():
+        try:
+            report = video_normalizer.normalize(video_path, scratch.path("normalized.mp4"), scratch.path("audio.pcm"))
+        except TranscodeError as e:
+            print(f"Job {job_id} uploading original video; transcode failed: {e}")
+            return None
+        media.update(video_path=report.pop("video_path"), pcm_path=report.pop("pcm_path"))
+        job_queue.publish(job_id, "normalized", **report)
+        print(f"Job {job_id} normalized video {report['input_bytes']} -> {report['output_bytes']} bytes "
+              f"in {report['seconds']}s")
+        return report
+
+    def upload_video():
+        # Twelve Labs branch: upload the video, then let the task watcher follow the indexing
+        client = twelvelabs_clients.get(api_key)
         task = client.task.create(
             index_id=index_id,
-            file=video_path
+            file=media["video_path"]
         )
+        indexing_start = time.perf_counter()
+
+        def on_task_update(task):
+            print(f"Job {job_id} Task Status={task.status}")
+            process = getattr(task, 'process', None)
+            percentage = process.get('percentage') if isinstance(process, dict) else getattr(process, 'percentage', None)
+            job_queue.publish(job_id, "indexing", status=task.status, percentage=percentage)
+
+        def on_indexed(task, error):
+            pipeline.timings["indexing"] = round(time.perf_counter() - indexing_start, 3)
+            if error is not None:
+                indexed.set_exception(error)
+            else:
+                indexed.set_result((client, task))
+
+        task_watcher.watch(client, task.id, on_indexed, timeout=INDEXING_TIMEOUT, on_update=on_task_update)
+
+    def analyze_answer():
+        # Transcript branch: does not depend on Twelve Labs, so it runs alongside it
+        transcript, complete = pipeline.stage("transcript", get_transcript, media["video_path"], media["pcm_path"])
+        job_queue.publish(job_id, "transcript_ready", words=len(transcript.split()))
+        gemini_analysis = pipeline.stage(
+            "gemini", analyze_with_gemini, question, transcript,
+            on_chunk=lambda text: job_queue.publish(job_id, "gemini_chunk", text=text)
+        )
+        job_queue.publish(job_id, "gemini_done")
+        return transcript, gemini_analysis, complete and gemini_analysis != GEMINI_ANALYSIS_FAILED
 
-        def on_task_update(task: Task):
-            print(f"Task Status={task.status}")
-
-        task.wait_for_done(sleep_interval=5, callback=on_task_update)
-
+    def finish(job_id, indexed, transcript, gemini_analysis, answer_complete):
+        # Runs on a job_queue worker once indexing has ended
+        client, task = indexed.result()
         if task.status != "ready":
             raise RuntimeError(f"Indexing failed with status {task.status}")
-
         print("Task completed successfully. Video ID:", task.video_id)
+        job_queue.publish(job_id, "generation_started", video_id=task.video_id)
 
-        prompt = """You're an Interviewer, Analyze the video clip of the interview answer.
-        Rules for scoring:
-        - If **no face is detected**, give **less than 5** for all categories.
-        - If **no voice is detected**, set `"clarity"`, `"speech_rate"`, `"voice_tone"` to **1** and add `"No speech detected"` to `"imp_points"`.
-        - If **both face and voice are missing**, return the following JSON:
-        ```json
-        {
-            "error": "No valid face or speech detected in the video."
-        }
-
-        Otherwise provide the response in the following JSON format with numerical values from 1-10:
-        {
-            "confidence": <number>,
-            "clarity": <number>,
-            "speech_rate": <number>,
-            "eye_contact": <number>,
-            "body_language": <number>,
-            "voice_tone": <number>,
-            "imp_points": [<list of important points as strings>]
-        }"""
-
-        result = client.generate.text(
+        result = pipeline.stage(
+            "generate",
+            client.generate.text,
             video_id=task.video_id,
-            prompt=prompt
+            prompt=TWELVELABS_PROMPT
         )
 
         print("Raw API Response:", result.data)
-        processed_data = process_api_response(result.data)
-
-        # Store results in Database
-        email = session['email']
-        question = session.get('current_question')  # Retrieve question from session.
-
+        processed_data, scores_complete = process_api_response(result.data)
         print(f"Processed data: {processed_data}")
+        job_queue.publish(job_id, "generation_done", twelvelabs_data=processed_data)
+
+        # Don't pin defaulted scores, a partial transcript or a failed Gemini call in the
+        # cache; the retry or re-upload it exists for should get a fresh attempt
+        if scores_complete and answer_complete:
+            analysis_cache.set(cache_key, {
+                "video_id": task.video_id,
+                "processed_data": processed_data,
+                "transcript": transcript,
+                "gemini_analysis": gemini_analysis
+            })
+        return report(task.video_id, processed_data, transcript, gemini_analysis, cached=False)
 
-        transcript = get_transcript(video_path)
-        gemini_analysis = analyze_with_gemini(question, transcript)
+    def report(video_id, processed_data, transcript, gemini_analysis, cached):
+        pipeline.timings["total"] = round(time.perf_counter() - start, 3)
 
-        results_collection.insert_one({
+        # Store results in Database
+        store_result({
             "email": email,
-            "video_id": task.video_id,
-            "question": question,  # Use the question from the session.
+            "video_id": video_id,
+            "question": question,
             "results": processed_data,
             "gemini_analysis": gemini_analysis
         })
 
-        return jsonify({
+        return {
             "twelvelabs_data": processed_data,
-            "gemini_analysis": gemini_analysis
-        }), 200
+            "gemini_analysis": gemini_analysis,
+            "transcript": transcript,
+            "cached": cached,
+            "transcode": transcode,
+            "timings": pipeline.timings
+        }
 
-    except Exception as e:
-        print(f"Error processing video: {str(e)}")
-        return jsonify({"error": f"Error processing video: {str(e)}"}), 500
+    try:
+        job_queue.publish(job_id, "upload_received", bytes=os.path.getsize(video_path))
+        start = time.perf_counter()
+        cache_key = analysis_cache_key(video_hash, index_id, question)
+        cached = analysis_cache.get(cache_key)
+        transcode = None
+        if cached:
+            print(f"Job {job_id} reusing cached analysis for video {video_hash}")
+            job_queue.publish(job_id, "cache_hit")
+            return report(
+                cached["video_id"], cached["processed_data"], cached["transcript"], cached["gemini_analysis"],
+                cached=True
+            )
 
+        if video_normalizer is not None:
+            transcode = pipeline.stage("normalize", normalize_video)
+        branches = pipeline.run_parallel({
+            "upload": upload_video,
+            "answer_branch": analyze_answer
+        })
     finally:
-        if os.path.exists(video_path):
-            os.remove(video_path)
+        # Twelve Labs has the upload and the transcript is done, so the local files can go
+        scratch.cleanup()
+
+    # Free this worker while Twelve Labs indexes; finish() picks the job up again
+    indexed.add_done_callback(
+        lambda future: job_queue.resume(job_id, finish, future, *branches["answer_branch"])
+    )
+    return JOB_DEFERRED
 
-def analyze_with_gemini(question, transcript):
+def analyze_with_gemini(question, transcript, on_chunk=None):
+    """Return Gemini's markdown feedback. If on_chunk is given it is called with each piece of text as it streams in."""
     
     prompt = f"""
     You are a professional career coach providing constructive feedback on interview performance.
@@ -503,17 +1094,22 @@ def analyze_with_gemini(question, transcript):
     Analysis:
     """
     try:
-        response = gemini_model.generate_content(prompt)
-        return response.text
+        if on_chunk is None:
+            return llm.generate(prompt)
+        chunks = []
+        for chunk in llm.stream(prompt):
+            chunks.append(chunk)
+            on_chunk(chunk)
+        return "".join(chunks)
     except Exception as e:
         print(f"Error in Gemini analysis: {e}")
-        return "Gemini analysis failed."
+        return GEMINI_ANALYSIS_FAILED
 
 @app.route('/api/history')
 @jwt_required()
 def history():
     user_id = get_jwt_identity()
-    user = users_collection.find_one({'_id': ObjectId(user_id)})
+    user = get_user(user_id)
     if not user:
         return jsonify({'error': 'User not found'}), 404
     
@@ -523,15 +1119,34 @@ def history():
 @jwt_required()
 def history_question(question):
     user_id = get_jwt_identity()
-    user = users_collection.find_one({'_id': ObjectId(user_id)})
+    user = get_user(user_id, 'email')
     if not user:
         return jsonify({'error': 'User not found'}), 404
         
     email = user['email']
     question = unquote(question)
 
+    try:
+        limit = min(max(int(request.args.get('limit', HISTORY_PAGE_SIZE)), 1), HISTORY_MAX_PAGE_SIZE)
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
+
+    # Cursor pagination: newest first, resuming below the last _id the client saw
     query = {"email": email, "question": question}
-    results = list(results_collection.find(query).sort("_id", -1))
+    before = request.args.get('before')
+    if before:
+        if not ObjectId.is_valid(before):
+            return jsonify({'error': 'Invalid cursor'}), 400
+        query["_id"] = {"$lt": ObjectId(before)}
+
+    # Summary rows only; the full Gemini feedback is fetched per result
+    results = list(
+        results_collection.find(query, HISTORY_SUMMARY_PROJECTION)
+        .sort("_id", -1)
+        .limit(limit + 1)
+    )
+    has_more = len(results) > limit
+    results = results[:limit]
     
     # Convert ObjectId to string for JSON serialization
     for result in results:
@@ -539,14 +1154,46 @@ def history_question(question):
     
     return jsonify({
         'question': question,
-        'results': results
+        'results': results,
+        'next_before': results[-1]['_id'] if has_more else None
     })
 
+@app.route('/api/history/result/<result_id>')
+@jwt_required()
+def history_result(result_id):
+    user_id = get_jwt_identity()
+    user = get_user(user_id, 'email')
+    if not user:
+        return jsonify({'error': 'User not found'}), 404
+    if not ObjectId.is_valid(result_id):
+        return jsonify({'error': 'Result not found'}), 404
+
+    result = results_collection.find_one({"_id": ObjectId(result_id), "email": user['email']})
+    if not result:
+        return jsonify({'error': 'Result not found'}), 404
+
+    result['_id'] = str(result['_id'])
+    return jsonify(result)
+
+@app.route('/api/stats')
+@jwt_required()
+def get_stats():
+    user_id = get_jwt_identity()
+    user = get_user(user_id, 'email')
+    if not user:
+        return jsonify({'error': 'User not found'}), 404
+
+    try:
+        return jsonify(user_stats.get(user['email']))
+    except Exception as e:
+        print(f"Error computing stats: {str(e)}")
+        return jsonify({'error': f'Error computing stats: {str(e)}'}), 500
+
 @app.route('/api/user/profile')
 @jwt_required()
 def get_user_profile():
     user_id = get_jwt_identity()
-    user = users_collection.find_one({'_id': ObjectId(user_id)})
+    user = get_user(user_id, 'email', 'api_key', 'index_id')
     if not user:
         return jsonify({'error': 'User not found'}), 404
     
@@ -560,7 +1207,7 @@ def get_user_profile():
 @jwt_required()
 def update_user_profile():
     user_id = get_jwt_identity()
-    user = users_collection.find_one({'_id': ObjectId(user_id)})
+    user = get_user(user_id, 'api_key')
     if not user:
         return jsonify({'error': 'User not found'}), 404
     
@@ -588,6 +1235,7 @@ def update_user_profile():
             {'_id': ObjectId(user_id)},
             {'$set': update_fields}
         )
+        invalidate_user(user_id)
     
     return jsonify({'message': 'Profile updated successfully'})
 
@@ -599,14 +1247,48 @@ def reset_questions():
         {'_id': ObjectId(user_id)},
         {'$set': {'asked_questions': [], 'current_question': None}}
     )
+    invalidate_user(user_id)
     return jsonify({'message': 'Questions reset successfully'})
 
+def save_resume_file(user_id, resume_file, job_description, extract=True):
+    """Save an uploaded resume and create its record. Returns the new resume ID."""
+    # Create uploads directory if it doesn't exist
+    resume_dir = os.path.join('uploads', 'resumes')
+    os.makedirs(resume_dir, exist_ok=True)
+    
+    # Generate a unique ID for this resume
+    resume_id = str(ObjectId())
+    
+    # Save the resume file
+    file_ext = os.path.splitext(resume_file.filename)[1]
+    resume_path = os.path.join(resume_dir, f"{resume_id}{file_ext}")
+    resume_file.save(resume_path)
+    
+    # Store resume info in database
+    resume_data = {
+        "user_id": user_id,
+        "resume_id": resume_id,
+        "filename": resume_file.filename,
+        "file_path": resume_path,
+        "job_description": job_description,
+        "upload_date": datetime.datetime.now(),
+        "analyzed": False,
+        "extraction_status": "pending"
+    }
+    
+    db.resumes.insert_one(resume_data)
+
+    # Parse the file once, off the request thread; analysis and chat read the stored text
+    if extract:
+        extraction_queue.submit(extract_resume_job, resume_id, resume_path, owner=user_id)
+    return resume_id
+
 @app.route('/resume/upload', methods=['POST'])
 @jwt_required()
 def upload_resume():
     try:
         user_id = get_jwt_identity()
-        user = users_collection.find_one({'_id': ObjectId(user_id)})
+        user = get_user(user_id)
         if not user:
             return jsonify({'error': 'User not found'}), 404
             
@@ -616,34 +1298,12 @@ def upload_resume():
         resume_file = request.files['resume']
         if resume_file.filename == '':
             return jsonify({"error": "No resume file selected"}), 400
+        if os.path.splitext(resume_file.filename)[1].lower() not in SUPPORTED_EXTENSIONS:
+            return jsonify({"error": "Unsupported resume format; please upload PDF, DOCX or TXT"}), 400
             
-        # Create uploads directory if it doesn't exist
-        resume_dir = os.path.join('uploads', 'resumes')
-        os.makedirs(resume_dir, exist_ok=True)
-        
-        # Generate a unique ID for this resume
-        resume_id = str(ObjectId())
-        
-        # Save the resume file
-        file_ext = os.path.splitext(resume_file.filename)[1]
-        resume_path = os.path.join(resume_dir, f"{resume_id}{file_ext}")
-        resume_file.save(resume_path)
-        
         # Store job description if provided
         job_description = request.form.get('job_description', '')
-        
-        # Store resume info in database
-        resume_data = {
-            "user_id": user_id,
-            "resume_id": resume_id,
-            "filename": resume_file.filename,
-            "file_path": resume_path,
-            "job_description": job_description,
-            "upload_date": datetime.datetime.now(),
-            "analyzed": False
-        }
-        
-        db.resumes.insert_one(resume_data)
+        resume_id = save_resume_file(user_id, resume_file, job_description)
         
         return jsonify({"resumeId": resume_id}), 200
         
@@ -651,6 +1311,245 @@ def upload_resume():
         print(f"Error uploading resume: {str(e)}")
         return jsonify({"error": f"Error uploading resume: {str(e)}"}), 500
 
+# How long an extraction claim is honoured before another request may take over
+RESUME_EXTRACTION_LEASE = int(os.getenv('RESUME_EXTRACTION_LEASE', 2 * 60))
+
+resume_text_flight = SingleFlight()
+
+def store_resume_text(resume_id, file_path):
+    """Extract the resume's text and save it (with page and section structure) on the resume record.
+
+    The file is parsed once even if the upload's background job and an
+    analysis request both ask for it: callers in one process share a call,
+    and across processes an "extracting" claim on the record decides who
+    parses while the others wait for the stored result.
+    """
+    return resume_text_flight.do(resume_id, lambda: extract_resume_once(resume_id, file_path))
+
+def extract_resume_once(resume_id, file_path):
+    while True:
+        now = datetime.datetime.now()
+        claimed = db.resumes.find_one_and_update(
+            {
+                "resume_id": resume_id,
+                "$or": [
+                    # None also matches records uploaded before extraction moved to upload time
+                    {"extraction_status": {"$in": ["pending", None]}},
+                    {"extraction_status": "extracting", "extraction_lease_until": {"$lt": now}}
+                ]
+            },
+            {"$set": {
+                "extraction_status": "extracting",
+                "extraction_lease_until": now + timedelta(seconds=RESUME_EXTRACTION_LEASE)
+            }},
+            projection={"_id": 1}
+        )
+        if claimed:
+            break
+
+        done = db.resumes.find_one(
+            {"resume_id": resume_id},
+            {"extracted_text": 1, "pages": 1, "sections": 1, "extraction_status": 1, "extraction_error": 1}
+        )
+        if done is None:
+            raise ExtractionError("Resume not found")
+        if done.get("extraction_status") == "failed":
+            raise ExtractionError(done.get("extraction_error") or "Could not extract text from the resume")
+        if done.get("extracted_text") is not None:
+            return {"text": done["extracted_text"], "pages": done.get("pages", []), "sections": done.get("sections", [])}
+        time.sleep(0.5)
+
+    try:
+        extracted = extract_resume_text(file_path)
+    except Exception as e:
+        db.resumes.update_one(
+            {"resume_id": resume_id},
+            {"$set": {"extraction_status": "failed", "extraction_error": str(e)},
+             "$unset": {"extraction_lease_until": ""}}
+        )
+        raise
+
+    db.resumes.update_one(
+        {"resume_id": resume_id},
+        {"$set": {
+            "extracted_text": extracted["text"],
+            "pages": extracted["pages"],
+            "sections": extracted["sections"],
+            "extraction_status": "done"
+        }, "$unset": {"extraction_lease_until": ""}}
+    )
+    return extracted
+
+def extract_resume_job(job_id, resume_id, file_path):
+    extracted = store_resume_text(resume_id, file_path)
+    return {"characters": len(extracted["text"]), "pages": len(extracted["pages"])}
+
+# How long an analysis claim is honoured before another request may take over,
+# and how long a request waits on someone else's in-flight analysis before
+# answering 202. Keep the wait under the client's 60s request timeout
+RESUME_ANALYSIS_LEASE = int(os.getenv('RESUME_ANALYSIS_LEASE', 5 * 60))
+RESUME_ANALYSIS_WAIT = int(os.getenv('RESUME_ANALYSIS_WAIT', 45))
+
+resume_analysis_flight = SingleFlight()
+
+class AnalysisInProgress(Exception):
+    pass
+
+def get_resume_text(resume_data):
+    # Use the text extracted at upload time; if the background extraction
+    # hasn't finished yet, wait for it (or take it over) rather than parse again
+    resume_text = resume_data.get("extracted_text")
+    if resume_text is None:
+        resume_text = store_resume_text(resume_data["resume_id"], resume_data["file_path"])["text"]
+    return resume_text
+
+def run_resume_analysis(resume_data, job=None, improve=True):
+    """Call Gemini on the resume and return (analysis_json, ai_generated_resume).
+
+    `job` is a JobDescription that overrides the one stored with the resume
+    (batch runs share one). The job match score and missing keywords come
+    from the local keyword scorer; Gemini only writes the qualitative
+    summary and recommendations. With improve=False the improved resume is
+    not requested, which keeps the response short when only the scores are
+    needed.
+    """
+    resume_id = resume_data["resume_id"]
+    resume_text = get_resume_text(resume_data)
+        
+    # Get job description if available
+    if job is None and resume_data.get("job_description"):
+        job = JobDescription(resume_data["job_description"])
+    local_match = job.score(resume_text) if job else None
+    
+    # Analyze resume with Gemini AI
+    job_context = f"""Job Description: {job.prompt_text}
+
+    A keyword screen already scored this resume {local_match["score"]}/100 against the job.
+    Matched keywords: {", ".join(local_match["matched_keywords"]) or "none"}.
+    Missing keywords: {", ".join(local_match["missing_keywords"]) or "none"}.
+    Do not re-score keywords; judge the qualitative fit (seniority, relevance of experience, impact).""" if job else ""
+    job_match_format = """,
+     "job_match": {"summary": "<summary of how well the resume matches the job>",
+                   "recommendations": ["<recommendation 1>", "<recommendation 2>", ...]}""" if job else ""
+    prompt = f"""
+    You are a professional resume analyst. Please analyze the following resume:
+    
+    {resume_text}
+    
+    {job_context}
+    
+    {"Also generate an improved version of the resume that addresses the weaknesses and better highlights the strengths." if improve else ""}
+
+    Respond with a single JSON object in the following format:
+    {{"score": <number between 0-100>,
+     "summary": "<brief summary of the resume>",
+     "strengths": ["<strength 1>", "<strength 2>", ...],
+     "improvements": ["<improvement 1>", "<improvement 2>", ...],
+     "keywords": ["<keyword 1>", "<keyword 2>", ...],
+     "improved_resume": "{"<the improved resume as plain text>" if improve else ""}"{job_match_format}
+    }}
+    """
+    
+    # Call Gemini API in JSON mode
+    response_text = llm.generate(prompt, json_mode=True)
+    
+    analysis_json, start, end = extract_json(response_text)
+    if analysis_json is not None:
+        analysis_json, errors = validate(analysis_json, RESUME_ANALYSIS_SCHEMA if job else RESUME_ANALYSIS_BASE_SCHEMA)
+        if errors:
+            print(f"Resume analysis for {resume_id} had invalid fields: {errors}")
+        ai_generated_resume = analysis_json.pop("improved_resume") or (response_text[:start] + response_text[end:]).strip()
+    else:
+        # Don't keep an unparseable response cached; the next analysis should ask again
+        llm.forget(prompt, json_mode=True)
+        # If no JSON found, use the whole response as the resume
+        ai_generated_resume = response_text
+        analysis_json = {
+            "score": 70,
+            "summary": "Basic resume analysis completed.",
+            "strengths": ["Resume has been processed"],
+            "improvements": ["Consider adding more details"],
+            "keywords": []
+        }
+    
+    if job:
+        analysis_json["job_match"] = dict(
+            analysis_json.get("job_match") or {},
+            score=local_match["score"],
+            missing_keywords=local_match["missing_keywords"]
+        )
+
+    # Add resumeId to the analysis
+    analysis_json["resumeId"] = resume_id
+    return analysis_json, ai_generated_resume
+
+def analyze_resume_once(resume_data):
+    """Analyze a resume at most once across requests and workers.
+
+    The caller that atomically moves analysis_status to "analyzing" does the
+    work; everyone else waits for its result. A claim expires after
+    RESUME_ANALYSIS_LEASE seconds so a crashed worker cannot block the resume.
+    Raises AnalysisInProgress if the result is not ready within
+    RESUME_ANALYSIS_WAIT seconds.
+    """
+    resume_id = resume_data["resume_id"]
+    token = uuid.uuid4().hex
+    deadline = time.monotonic() + RESUME_ANALYSIS_WAIT
+
+    while True:
+        now = datetime.datetime.now()
+        claimed = db.resumes.find_one_and_update(
+            {
+                "resume_id": resume_id,
+                "analysis": {"$exists": False},
+                "$or": [
+                    {"analysis_status": {"$ne": "analyzing"}},
+                    {"analysis_lease_until": {"$lt": now}}
+                ]
+            },
+            {"$set": {
+                "analysis_status": "analyzing",
+                "analysis_owner": token,
+                "analysis_lease_until": now + timedelta(seconds=RESUME_ANALYSIS_LEASE)
+            }},
+            projection={"_id": 1}
+        )
+        if claimed:
+            break
+
+        done = db.resumes.find_one({"resume_id": resume_id}, {"analysis": 1, "ai_generated_resume": 1})
+        if done and done.get("analysis"):
+            return done["analysis"], done.get("ai_generated_resume", "")
+        if time.monotonic() > deadline:
+            raise AnalysisInProgress(resume_id)
+        time.sleep(1)
+
+    try:
+        analysis_json, ai_generated_resume = run_resume_analysis(resume_data)
+    except Exception:
+        # Release the claim so the next request can retry straight away
+        db.resumes.update_one(
+            {"resume_id": resume_id, "analysis_owner": token},
+            {"$set": {"analysis_status": "pending"}, "$unset": {"analysis_owner": "", "analysis_lease_until": ""}}
+        )
+        raise
+
+    # Update the database with the analysis results
+    db.resumes.update_one(
+        {"resume_id": resume_id},
+        {
+            "$set": {
+                "analysis": analysis_json,
+                "ai_generated_resume": ai_generated_resume,
+                "analyzed": True,
+                "analysis_status": "done",
+                "analysis_date": datetime.datetime.now()
+            },
+            "$unset": {"analysis_owner": "", "analysis_lease_until": ""}
+        }
+    )
+    return analysis_json, ai_generated_resume
+
 @app.route('/resume/analyze/<resume_id>', methods=['GET'])
 @jwt_required()
 def analyze_resume(resume_id):
@@ -658,7 +1557,10 @@ def analyze_resume(resume_id):
         user_id = get_jwt_identity()
         
         # Find the resume in the database
-        resume_data = db.resumes.find_one({"resume_id": resume_id, "user_id": user_id})
+        resume_data = db.resumes.find_one(
+            {"resume_id": resume_id, "user_id": user_id},
+            {"chat_history": 0, "chat_history_legacy": 0, "pages": 0, "sections": 0}
+        )
         if not resume_data:
             return jsonify({"error": "Resume not found"}), 404
             
@@ -668,94 +1570,16 @@ def analyze_resume(resume_id):
                 "analysis": resume_data["analysis"],
                 "aiGeneratedResume": resume_data.get("ai_generated_resume", "")
             }), 200
-            
-        # Extract text from resume file
-        # For simplicity, we'll assume it's a text file for now
-        # In a real app, you'd use libraries like PyPDF2 for PDFs or python-docx for Word docs
-        resume_text = ""
-        with open(resume_data["file_path"], "r", encoding="utf-8", errors="ignore") as f:
-            resume_text = f.read()
-            
-        # Get job description if available
-        job_description = resume_data.get("job_description", "")
-        
-        # Analyze resume with Gemini AI
-        prompt = f"""
-        You are a professional resume analyst. Please analyze the following resume:
-        
-        {resume_text}
-        
-        {"Job Description: " + job_description if job_description else ""}
-        
-        Provide a detailed analysis in the following JSON format:
-        {{"score": <number between 0-100>,
-         "summary": "<brief summary of the resume>",
-         "strengths": ["<strength 1>", "<strength 2>", ...],
-         "improvements": ["<improvement 1>", "<improvement 2>", ...],
-         "keywords": ["<keyword 1>", "<keyword 2>", ...]
-        }}
-        
-        {"Also include a job match analysis in the following format:\n" +
-        "\"job_match\": {{\n" +
-        "  \"score\": <match percentage>,\n" +
-        "  \"summary\": \"<summary of how well the resume matches the job>\",\n" +
-        "  \"missing_keywords\": [\"<missing keyword 1>\", \"<missing keyword 2>\", ...],\n" +
-        "  \"recommendations\": [\"<recommendation 1>\", \"<recommendation 2>\", ...]\n" +
-        "}}" if job_description else ""}
-        
-        Also generate an improved version of the resume that addresses the weaknesses and better highlights the strengths.
-        """
-        
-        # Call Gemini API
-        response = gemini_model.generate_content(prompt)
-        
-        # Parse the response
-        response_text = response.text
-        
-        # Extract JSON part for analysis
-        import re
-        json_match = re.search(r'\{[\s\S]*\}', response_text)
-        analysis_json = {}
-        ai_generated_resume = ""
-        
-        if json_match:
-            try:
-                analysis_json = json.loads(json_match.group())
-                # Extract the AI-generated resume from the remaining text
-                ai_generated_resume = response_text.replace(json_match.group(), "").strip()
-            except json.JSONDecodeError:
-                # If JSON parsing fails, use a default structure
-                analysis_json = {
-                    "score": 70,
-                    "summary": "Analysis could not be properly formatted.",
-                    "strengths": ["Resume has been received"],
-                    "improvements": ["Try uploading a different format"],
-                    "keywords": []
-                }
-        else:
-            # If no JSON found, use the whole response as the resume
-            ai_generated_resume = response_text
-            analysis_json = {
-                "score": 70,
-                "summary": "Basic resume analysis completed.",
-                "strengths": ["Resume has been processed"],
-                "improvements": ["Consider adding more details"],
-                "keywords": []
-            }
-        
-        # Add resumeId to the analysis
-        analysis_json["resumeId"] = resume_id
-        
-        # Update the database with the analysis results
-        db.resumes.update_one(
-            {"resume_id": resume_id},
-            {"$set": {
-                "analysis": analysis_json,
-                "ai_generated_resume": ai_generated_resume,
-                "analyzed": True,
-                "analysis_date": datetime.datetime.now()
-            }}
-        )
+
+        # Concurrent requests in this process share one call; across processes the DB claim decides
+        try:
+            analysis_json, ai_generated_resume = resume_analysis_flight.do(
+                resume_id, lambda: analyze_resume_once(resume_data)
+            )
+        except ExtractionError as e:
+            return jsonify({"error": str(e)}), 400
+        except AnalysisInProgress:
+            return jsonify({"status": "analyzing", "resumeId": resume_id}), 202
         
         return jsonify({
             "analysis": analysis_json,
@@ -766,6 +1590,119 @@ def analyze_resume(resume_id):
         print(f"Error analyzing resume: {str(e)}")
         return jsonify({"error": f"Error analyzing resume: {str(e)}"}), 500
 
+BATCH_MAX_RESUMES = int(os.getenv('BATCH_MAX_RESUMES', 50))
+
+# Shared across all batch jobs so the total number of concurrent Gemini calls stays bounded
+batch_pool = ThreadPoolExecutor(
+    max_workers=int(os.getenv('BATCH_ANALYSIS_WORKERS', 4)),
+    thread_name_prefix="batch"
+)
+
+def job_match_score(entry):
+    score = (entry.get("analysis") or {}).get("job_match", {}).get("score")
+    return score if isinstance(score, (int, float)) else -1
+
+def run_resume_batch(job_id, user_id, resume_ids, job_description, analyze_top=None):
+    """Analyze many resumes against one job description and rank them by job match score.
+
+    Every resume is first scored locally against the job description. Only
+    the best `analyze_top` (all, if None) go on to a Gemini analysis; the
+    rest are returned with their local score.
+    """
+    job = JobDescription(job_description)
+    resumes = list(db.resumes.find(
+        {"resume_id": {"$in": resume_ids}, "user_id": user_id},
+        {"chat_history": 0, "chat_history_legacy": 0, "pages": 0, "sections": 0}
+    ))
+    found = {r["resume_id"] for r in resumes}
+
+    # Local pre-ranking: milliseconds per resume, no API calls
+    entries = []
+    failed = []
+    for resume_data in resumes:
+        entry = {"resumeId": resume_data["resume_id"], "filename": resume_data.get("filename")}
+        try:
+            entry["local_match"] = job.score(get_resume_text(resume_data))
+            entries.append((entry, resume_data))
+        except Exception as e:
+            print(f"Error reading resume {resume_data['resume_id']} in batch: {str(e)}")
+            entry["error"] = str(e)
+            failed.append(entry)
+    entries.sort(key=lambda pair: pair[0]["local_match"]["score"], reverse=True)
+    to_analyze = entries if analyze_top is None else entries[:analyze_top]
+    screened_out = [entry for entry, _ in entries[len(to_analyze):]]
+
+    def analyze(entry, resume_data):
+        try:
+            entry["analysis"], _ = run_resume_analysis(resume_data, job=job, improve=False)
+        except Exception as e:
+            print(f"Error analyzing resume {resume_data['resume_id']} in batch: {str(e)}")
+            entry["error"] = str(e)
+        job_queue.publish(job_id, "resume_analyzed", resumeId=entry["resumeId"], ok="error" not in entry)
+        return entry
+
+    analyzed = [future.result() for future in [batch_pool.submit(analyze, *pair) for pair in to_analyze]]
+    ranked = sorted((e for e in analyzed if "error" not in e), key=job_match_score, reverse=True)
+    failed += [e for e in analyzed if "error" in e]
+
+    return {
+        "job_keywords": job.keywords,
+        "results": ranked + screened_out + failed,
+        "not_found": [rid for rid in resume_ids if rid not in found]
+    }
+
+@app.route('/resume/batch-analyze', methods=['POST'])
+@jwt_required()
+def batch_analyze_resumes():
+    try:
+        user_id = get_jwt_identity()
+        if not get_user(user_id):
+            return jsonify({'error': 'User not found'}), 404
+
+        # Either JSON {resumeIds, job_description} or multipart with resume files (and optional resumeIds)
+        if request.mimetype == 'multipart/form-data':
+            job_description = request.form.get('job_description', '')
+            resume_ids = request.form.getlist('resumeIds')
+            analyze_top = request.form.get('analyzeTop')
+            files = [f for f in request.files.getlist('resumes') if f.filename]
+        else:
+            data = request.get_json(silent=True)
+            if not isinstance(data, dict):
+                return jsonify({"error": "Expected a JSON object or multipart form"}), 400
+            job_description = data.get('job_description', '')
+            resume_ids = data.get('resumeIds', [])
+            analyze_top = data.get('analyzeTop')
+            files = []
+
+        if not isinstance(resume_ids, list) or not all(isinstance(r, str) and r for r in resume_ids):
+            return jsonify({"error": "resumeIds must be a list of resume IDs"}), 400
+        if not isinstance(job_description, str):
+            return jsonify({"error": "job_description must be a string"}), 400
+
+        try:
+            analyze_top = int(analyze_top) if analyze_top not in (None, '') else None
+        except (TypeError, ValueError):
+            return jsonify({"error": "analyzeTop must be an integer"}), 400
+
+        if not job_description.strip():
+            return jsonify({"error": "A job description is required"}), 400
+        if not resume_ids and not files:
+            return jsonify({"error": "Provide resumeIds or resume files"}), 400
+        if len(resume_ids) + len(files) > BATCH_MAX_RESUMES:
+            return jsonify({"error": f"At most {BATCH_MAX_RESUMES} resumes per batch"}), 400
+
+        # The batch extracts text itself, so skip the per-file background extraction
+        resume_ids = list(resume_ids) + [
+            save_resume_file(user_id, f, job_description, extract=False) for f in files
+        ]
+
+        job_id = batch_queue.submit(run_resume_batch, user_id, resume_ids, job_description, analyze_top, owner=user_id)
+        return jsonify({"job_id": job_id, "status": JOB_QUEUED, "resumeIds": resume_ids}), 202
+
+    except Exception as e:
+        print(f"Error starting batch analysis: {str(e)}")
+        return jsonify({"error": f"Error starting batch analysis: {str(e)}"}), 500
+
 @app.route('/resume/chat', methods=['POST'])
 @jwt_required()
 def resume_chat():
@@ -779,57 +1716,83 @@ def resume_chat():
         if not resume_id or not message:
             return jsonify({"error": "Resume ID and message are required"}), 400
             
-        # Find the resume in the database
-        resume_data = db.resumes.find_one({"resume_id": resume_id, "user_id": user_id})
+        # Find the resume in the database (legacy chat_history arrays can be large; skip them)
+        resume_data = db.resumes.find_one(
+            {"resume_id": resume_id, "user_id": user_id},
+            {"chat_history": 0, "chat_history_legacy": 0}
+        )
         if not resume_data:
             return jsonify({"error": "Resume not found"}), 404
             
-        # Get the analysis and resume text
-        analysis = resume_data.get("analysis", {})
-        ai_resume = resume_data.get("ai_generated_resume", "")
-        
-        # Create a prompt for Gemini
-        prompt = f"""
-        You are a helpful resume assistant. You have analyzed a user's resume and provided the following analysis:
-        
-        {json.dumps(analysis)}
-        
-        You have also generated an improved version of their resume:
-        
-        {ai_resume}
-        
-        The user is asking the following question about their resume:
-        
-        {message}
-        
-        Please provide a helpful, specific response to their question. Focus on practical advice that they can implement.
-        """
+        # Create a prompt for Gemini: resume context, summary of older turns and the recent window
+        prompt = chat_context.build_prompt(resume_data, message)
         
+        # Stream tokens back as they arrive when the client asks for it
+        if data.get('stream') or 'text/event-stream' in request.headers.get('Accept', ''):
+            def stream():
+                chunks = []
+                try:
+                    for chunk in llm.stream(prompt):
+                        chunks.append(chunk)
+                        yield f"event: chunk\ndata: {json.dumps({'text': chunk})}\n\n"
+                except Exception as e:
+                    print(f"Error in resume chat stream: {str(e)}")
+                    yield f"event: error\ndata: {json.dumps({'error': f'Error processing chat: {str(e)}'})}\n\n"
+                    return
+                reply = "".join(chunks)
+                chat_context.record_turn(resume_data, user_id, message, reply)
+                yield f"event: done\ndata: {json.dumps({'reply': reply})}\n\n"
+
+            return Response(stream(), mimetype='text/event-stream', headers={
+                'Cache-Control': 'no-cache',
+                'X-Accel-Buffering': 'no'
+            })
+
         # Call Gemini API
-        response = gemini_model.generate_content(prompt)
+        reply = llm.generate(prompt)
+        chat_context.record_turn(resume_data, user_id, message, reply)
         
-        # Store the chat in the database
-        if not resume_data.get("chat_history"):
-            db.resumes.update_one(
-                {"resume_id": resume_id},
-                {"$set": {"chat_history": []}}
-            )
-            
-        db.resumes.update_one(
-            {"resume_id": resume_id},
-            {"$push": {"chat_history": {
-                "user": message,
-                "ai": response.text,
-                "timestamp": datetime.datetime.now()
-            }}}
-        )
-        
-        return jsonify({"reply": response.text}), 200
+        return jsonify({"reply": reply}), 200
         
     except Exception as e:
         print(f"Error in resume chat: {str(e)}")
         return jsonify({"error": f"Error processing chat: {str(e)}"}), 500
 
+def reset_after_fork():
+    """Drop network clients inherited from the parent so each worker builds its own."""
+    llm.reset_after_fork()
+    http_sessions.reset_after_fork()
+    twelvelabs_clients.reset_after_fork()
+
+os.register_at_fork(after_in_child=reset_after_fork)
+
+startup_stats = {}
+
+def create_app():
+    """Finish per-process setup and return the app.
+
+    Run under gunicorn as `gunicorn "app:create_app()"` so this runs in each
+    worker. Heavy SDKs (Gemini, Twelve Labs, speech recognition) are imported
+    on first use rather than here.
+    """
+    if startup_stats:
+        return app
+    started = time.perf_counter()
+    # Remove scratch directories left over from a previous run
+    sweep_stale(max_age_seconds=24 * 60 * 60)
+    ensure_indexes()
+    startup_stats.update({
+        'pid': os.getpid(),
+        'import_seconds': round(started - IMPORT_STARTED, 3),
+        'init_seconds': round(time.perf_counter() - started, 3),
+        'rss_mb': rss_mb(),
+        'peak_rss_mb': peak_rss_mb()
+    })
+    print(f"Worker {startup_stats['pid']} ready: import {startup_stats['import_seconds']}s, "
+          f"init {startup_stats['init_seconds']}s, RSS {startup_stats['rss_mb']} MB")
+    return app
+
 if __name__ == '__main__':
     os.makedirs('uploads', exist_ok=True)
+    create_app()
     app.run(debug=True)
\ No newline at end of file
@@ -0,0 +1,194 @@
+import time
+import datetime
+import threading
+from collections import OrderedDict
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries also expire after ttl_seconds.
+
+    Keeps hit/miss/eviction counters so callers can report effectiveness.
+    """
+
+    def __init__(self, max_entries=256, ttl_seconds=24 * 60 * 60):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                self.evictions += 1
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl_seconds=None):
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / total, 3) if total else 0.0
+            }
+
+
+class MongoCacheStore:
+    """Optional second cache tier that persists values in a Mongo collection.
+
+    Entries outlive process restarts and are shared between workers; a TTL
+    index on created_at lets Mongo expire them.
+    """
+
+    field = "value"
+
+    def __init__(self, collection, ttl_seconds=7 * 24 * 60 * 60):
+        self.collection = collection
+        self.ttl_seconds = ttl_seconds
+        self._indexed = False
+
+    def ensure_index(self):
+        try:
+            try:
+                self.collection.create_index("created_at", expireAfterSeconds=self.ttl_seconds)
+            except Exception as e:
+                if getattr(e, "code", None) != 85:  # IndexOptionsConflict
+                    raise
+                # The TTL setting changed since the index was built; update it in place
+                self.collection.database.command(
+                    "collMod", self.collection.name,
+                    index={"keyPattern": {"created_at": 1}, "expireAfterSeconds": self.ttl_seconds}
+                )
+            self._indexed = True
+        except Exception as e:
+            print(f"Error creating cache index on {self.collection.name}: {e}")
+
+    def get(self, key):
+        doc = self.collection.find_one({"_id": key}, {self.field: 1})
+        return doc[self.field] if doc else None
+
+    def delete(self, key):
+        self.collection.delete_one({"_id": key})
+
+    def set(self, key, value):
+        if not self._indexed:
+            self.ensure_index()
+        self.collection.update_one(
+            {"_id": key},
+            {"$set": {self.field: value, "created_at": datetime.datetime.utcnow()}},
+            upsert=True
+        )
+
+
+class TieredCache:
+    """A TTLCache in front of an optional shared `store` (e.g. MongoCacheStore).
+
+    Store errors are logged and treated as misses, so the store can never
+    take the caller down with it.
+    """
+
+    def __init__(self, cache, store=None):
+        self.cache = cache
+        self.store = store
+        self.store_hits = 0
+
+    def get(self, key):
+        value = self.cache.get(key)
+        if value is not None or self.store is None:
+            return value
+        try:
+            value = self.store.get(key)
+        except Exception as e:
+            print(f"Error reading cache store: {e}")
+            return None
+        if value is not None:
+            self.store_hits += 1
+            self.cache.set(key, value)
+        return value
+
+    def set(self, key, value):
+        self.cache.set(key, value)
+        if self.store is not None:
+            try:
+                self.store.set(key, value)
+            except Exception as e:
+                print(f"Error writing cache store: {e}")
+
+    def stats(self):
+        return dict(self.cache.stats(), store_hits=self.store_hits)
+
+
+class _Call:
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Coalesces concurrent calls for the same key onto one execution.
+
+    The first caller for a key runs the function; callers arriving while it
+    is in flight wait and receive the same result (or exception).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, func):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = func()
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.event.set()
@@ -0,0 +1,204 @@
+import json
+import datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from pymongo.errors import CollectionInvalid
+
+from cache import TTLCache, SingleFlight
+
+
+def estimate_tokens(text):
+    # Rough rule of thumb for English text; good enough for budgeting prompts
+    return len(text) // 4
+
+
+def truncate_to_tokens(text, budget):
+    limit = budget * 4
+    return text if len(text) <= limit else text[:limit] + "\n[...truncated]"
+
+
+class ChatContext:
+    """Builds bounded prompts for resume chat.
+
+    Turns live in their own capped collection instead of an ever-growing
+    array on the resume document. A prompt carries the (cached, truncated)
+    resume context, a rolling summary of older turns, and as many recent
+    turns as fit in `history_budget` tokens. Once more than `keep_turns`
+    turns are unsummarized, the older ones are folded into the summary in
+    the background. The capped collection is created on first use, and a
+    resume's legacy `chat_history` array is moved into it the first time
+    that resume is chatted about.
+    """
+
+    def __init__(self, db, llm, collection_name="resume_chats", capped_bytes=256 * 1024 * 1024,
+                 history_budget=1500, resume_budget=3000, max_turns=20, keep_turns=6):
+        self.db = db
+        self.llm = llm
+        self.collection_name = collection_name
+        self.capped_bytes = capped_bytes
+        self.history_budget = history_budget
+        self.resume_budget = resume_budget
+        self.max_turns = max_turns
+        self.keep_turns = keep_turns
+        self._resume_contexts = TTLCache(max_entries=1024, ttl_seconds=60 * 60)
+        self._summarizing = SingleFlight()
+        self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="chat-summary")
+        self._ready = False
+        self._ready_lock = threading.Lock()
+
+    @property
+    def turns(self):
+        # Make sure the first insert can't implicitly create an uncapped, unindexed collection
+        if not self._ready:
+            with self._ready_lock:
+                if not self._ready:
+                    self.ensure_collection()
+        return self.db[self.collection_name]
+
+    def ensure_collection(self):
+        try:
+            self.db.create_collection(self.collection_name, capped=True, size=self.capped_bytes)
+        except CollectionInvalid:
+            pass  # already exists
+        self.db[self.collection_name].create_index([("resume_id", 1), ("_id", -1)])
+        self._ready = True
+
+    def _migrate_legacy_history(self, resume_id):
+        """Move a resume's old chat_history array into the turns collection. Returns True if there was one.
+
+        The array is claimed by renaming it to chat_history_legacy, so only
+        one caller migrates it; it is kept there as an archive.
+        """
+        legacy = self.db.resumes.find_one_and_update(
+            {"resume_id": resume_id, "chat_history.0": {"$exists": True}},
+            {"$rename": {"chat_history": "chat_history_legacy"}},
+            projection={"chat_history": 1, "user_id": 1}
+        )
+        if not legacy:
+            return False
+        try:
+            self.turns.insert_many([
+                {
+                    "resume_id": resume_id,
+                    "user_id": legacy.get("user_id"),
+                    "user": turn.get("user", ""),
+                    "ai": turn.get("ai", ""),
+                    "timestamp": turn.get("timestamp")
+                }
+                for turn in legacy["chat_history"]
+            ])
+        except Exception:
+            self.db.resumes.update_one(
+                {"resume_id": resume_id},
+                {"$rename": {"chat_history_legacy": "chat_history"}}
+            )
+            raise
+        # Long legacy histories get folded into the rolling summary
+        self._executor.submit(self._summarizing.do, resume_id, lambda: self._refresh_summary(resume_id))
+        return True
+
+    def resume_context(self, resume_data):
+        """The static analysis + improved resume part of the prompt, built once per analysis."""
+        key = (resume_data["resume_id"], str(resume_data.get("analysis_date")))
+        context = self._resume_contexts.get(key)
+        if context is None:
+            analysis = json.dumps(resume_data.get("analysis", {}))
+            ai_resume = truncate_to_tokens(resume_data.get("ai_generated_resume", ""), self.resume_budget)
+            context = f"""
+        You are a helpful resume assistant. You have analyzed a user's resume and provided the following analysis:
+
+        {analysis}
+
+        You have also generated an improved version of their resume:
+
+        {ai_resume}
+        """
+            self._resume_contexts.set(key, context)
+        return context
+
+    def window(self, resume_data):
+        """Return (summary, recent_turns) where recent_turns fit the history token budget, oldest first."""
+        query = {"resume_id": resume_data["resume_id"]}
+        if resume_data.get("chat_summary_upto"):
+            query["_id"] = {"$gt": resume_data["chat_summary_upto"]}
+        recent = list(self.turns.find(query, {"user": 1, "ai": 1}).sort("_id", -1).limit(self.max_turns))
+        if not recent and not resume_data.get("chat_summary_upto"):
+            if self._migrate_legacy_history(resume_data["resume_id"]):
+                recent = list(self.turns.find(query, {"user": 1, "ai": 1}).sort("_id", -1).limit(self.max_turns))
+
+        turns = []
+        used = 0
+        for turn in recent:
+            cost = estimate_tokens(turn["user"]) + estimate_tokens(turn["ai"])
+            if turns and used + cost > self.history_budget:
+                break
+            turns.append(turn)
+            used += cost
+        turns.reverse()
+        return resume_data.get("chat_summary", ""), turns
+
+    def build_prompt(self, resume_data, message):
+        summary, turns = self.window(resume_data)
+        history = ""
+        if summary:
+            history += f"\n        Summary of the earlier conversation:\n        {summary}\n"
+        if turns:
+            history += "\n        Recent conversation:\n" + "".join(
+                f"        User: {turn['user']}\n        Assistant: {turn['ai']}\n" for turn in turns
+            )
+        return f"""{self.resume_context(resume_data)}{history}
+        The user is asking the following question about their resume:
+
+        {message}
+
+        Please provide a helpful, specific response to their question. Focus on practical advice that they can implement.
+        """
+
+    def record_turn(self, resume_data, user_id, message, reply):
+        """Store one exchange and, if needed, fold older turns into the summary off the request thread."""
+        self.turns.insert_one({
+            "resume_id": resume_data["resume_id"],
+            "user_id": user_id,
+            "user": message,
+            "ai": reply,
+            "timestamp": datetime.datetime.now()
+        })
+        resume_id = resume_data["resume_id"]
+        self._executor.submit(self._summarizing.do, resume_id, lambda: self._refresh_summary(resume_id))
+
+    def _refresh_summary(self, resume_id):
+        try:
+            resume = self.db.resumes.find_one(
+                {"resume_id": resume_id},
+                {"chat_summary": 1, "chat_summary_upto": 1}
+            )
+            if not resume:
+                return
+            query = {"resume_id": resume_id}
+            if resume.get("chat_summary_upto"):
+                query["_id"] = {"$gt": resume["chat_summary_upto"]}
+            pending = list(self.turns.find(query, {"user": 1, "ai": 1}).sort("_id", 1))
+            if len(pending) <= self.keep_turns:
+                return
+
+            fold = pending[:-self.keep_turns]
+            transcript = "\n".join(f"User: {t['user']}\nAssistant: {t['ai']}" for t in fold)
+            summary = self.llm.generate(f"""
+        Update the running summary of a conversation between a user and a resume assistant.
+        Keep facts about the user's goals, decisions and advice already given. Be concise (under 200 words).
+
+        Current summary:
+        {resume.get("chat_summary", "") or "(none)"}
+
+        New messages:
+        {truncate_to_tokens(transcript, self.history_budget * 2)}
+
+        Updated summary:
+        """)
+            self.db.resumes.update_one(
+                {"resume_id": resume_id},
+                {"$set": {"chat_summary": summary.strip(), "chat_summary_upto": fold[-1]["_id"]}}
+            )
+        except Exception as e:
+            print(f"Error summarizing chat for resume {resume_id}: {e}")
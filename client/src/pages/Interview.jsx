@@ -258,6 +258,21 @@ const Interview = () => {
     }
   };
 
+  const waitForJob = async (jobId) => {
+    const deadline = Date.now() + 15 * 60 * 1000; // 15 minutes
+    while (Date.now() < deadline) {
+      const { data } = await api.get(`/api/jobs/${jobId}`);
+      if (data.status === 'done') {
+        return data;
+      }
+      if (data.status === 'failed') {
+        throw new Error(data.error || 'Video analysis failed.');
+      }
+      await new Promise(resolve => setTimeout(resolve, 3000));
+    }
+    throw new Error('Video analysis is taking too long. Please check your history later.');
+  };
+
   const uploadVideo = async (blob) => {
     try {
       setUploadProgress(0);
@@ -306,7 +321,10 @@ const Interview = () => {
         throw new Error(response.data.error);
       }
 
-      console.log('Video uploaded and analyzed successfully:', response.data);
+      // Analysis runs in the background; poll the job until it finishes
+      const job = await waitForJob(response.data.job_id);
+
+      console.log('Video uploaded and analyzed successfully:', job.result);
       
       // Update final step
       setAnalysisSteps(prev => ({
@@ -30,20 +30,15 @@ const ResumeAnalysis = () => {
   }, [loading, currentUser]);
 
   const validateFile = (file) => {
-    const allowedTypes = [
-      'application/pdf',
-      'application/msword',
-      'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
-    ];
-    
-    const allowedExtensions = ['.pdf', '.doc', '.docx'];
+    // Must match SUPPORTED_EXTENSIONS in resume_text.py; the server parses by extension
+    const allowedExtensions = ['.pdf', '.docx', '.txt', '.text', '.md'];
     const fileExtension = file.name.toLowerCase().substring(file.name.lastIndexOf('.'));
     
-    // Check file type and extension
-    if (!allowedTypes.includes(file.type) && !allowedExtensions.includes(fileExtension)) {
+    // Check file extension
+    if (!allowedExtensions.includes(fileExtension)) {
       return {
         isValid: false,
-        error: 'Please upload a PDF, DOC, or DOCX file only.'
+        error: 'Please upload a PDF, DOCX, or TXT file only.'
       };
     }
     
@@ -70,8 +65,9 @@ const ResumeAnalysis = () => {
   const { getRootProps, getInputProps, isDragActive } = useDropzone({
     accept: {
       'application/pdf': ['.pdf'],
-      'application/msword': ['.doc'],
-      'application/vnd.openxmlformats-officedocument.wordprocessingml.document': ['.docx']
+      'application/vnd.openxmlformats-officedocument.wordprocessingml.document': ['.docx'],
+      'text/plain': ['.txt', '.text'],
+      'text/markdown': ['.md']
     },
     maxFiles: 1,
     onDrop: acceptedFiles => {
@@ -95,7 +91,7 @@ const ResumeAnalysis = () => {
       if (rejectedFiles.length > 0) {
         const rejection = rejectedFiles[0];
         if (rejection.errors.some(error => error.code === 'file-invalid-type')) {
-          setError('Invalid file format. Please upload a PDF, DOC, or DOCX file.');
+          setError('Invalid file format. Please upload a PDF, DOCX, or TXT file.');
         } else if (rejection.errors.some(error => error.code === 'file-too-large')) {
           setError('File is too large. Please upload a file smaller than 10MB.');
         } else {
@@ -150,10 +146,19 @@ const ResumeAnalysis = () => {
       setIsAnalyzing(true);
       
       try {
-        // Get the analysis from the backend
-        const analysisResponse = await api.get(`/api/resume/analyze/${uploadResponse.data.resumeId}`, {
-          timeout: 60000 // 60 seconds timeout for analysis
-        });
+        // Get the analysis from the backend. If another request is already
+        // analyzing this resume the server answers 202; ask again until it's ready
+        const analyzeUrl = `/api/resume/analyze/${uploadResponse.data.resumeId}`;
+        const analyzeOptions = { timeout: 60000 }; // 60 seconds timeout for analysis
+        const pollDeadline = Date.now() + 5 * 60 * 1000;
+        let analysisResponse = await api.get(analyzeUrl, analyzeOptions);
+        while (analysisResponse.status === 202) {
+          if (Date.now() > pollDeadline) {
+            throw new Error('Analysis is taking longer than expected. Please try again in a few minutes.');
+          }
+          await new Promise(resolve => setTimeout(resolve, 2000));
+          analysisResponse = await api.get(analyzeUrl, analyzeOptions);
+        }
         
         console.log('Analysis completed:', analysisResponse.data.analysis?.score);
         
@@ -304,7 +309,7 @@ const ResumeAnalysis = () => {
                   <p>Drag & drop your resume here, or click to select a file</p>
                 )}
               </div>
-              <p className="hint">Supported formats: PDF, DOC, DOCX (All formats are fully supported and optimized)</p>
+              <p className="hint">Supported formats: PDF, DOCX, TXT (All formats are fully supported and optimized)</p>
             </div>
 
             <div className="form-group">
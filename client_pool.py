@@ -0,0 +1,84 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from cache import SingleFlight
+
+
+class KeyedClientPool:
+    """Bounded LRU pool of long-lived clients, one per API key.
+
+    `factory(api_key)` builds a client the first time a key is seen; later
+    requests (from any thread) reuse it, so connection pools and TLS sessions
+    survive across uploads. Clients are built outside the pool lock, with
+    concurrent misses for one key coalesced, so a slow first construction
+    never holds up lookups for other keys. When the pool is full the least
+    recently used client is dropped but not closed, since a job may still be
+    using it; it is released once garbage collected.
+    """
+
+    def __init__(self, factory, max_size=32):
+        self.factory = factory
+        self.max_size = max_size
+        self._clients = OrderedDict()
+        self._lock = threading.Lock()
+        self._flight = SingleFlight()
+        self.created = 0
+        self.reused = 0
+        self.evicted = 0
+
+    def get(self, api_key):
+        key = hashlib.sha256(api_key.encode("utf-8")).hexdigest()
+        with self._lock:
+            client = self._clients.get(key)
+            if client is not None:
+                self._clients.move_to_end(key)
+                self.reused += 1
+                return client
+        return self._flight.do(key, lambda: self._create(key, api_key))
+
+    def _create(self, key, api_key):
+        client = self.factory(api_key)
+        with self._lock:
+            # Another thread may have finished building one for this key first
+            existing = self._clients.get(key)
+            if existing is not None:
+                self._clients.move_to_end(key)
+                return existing
+            self._clients[key] = client
+            self.created += 1
+            while len(self._clients) > self.max_size:
+                self._clients.popitem(last=False)
+                self.evicted += 1
+            return client
+
+    def reset_after_fork(self):
+        """Forget clients inherited from a parent process; their sockets belong to the parent."""
+        self._lock = threading.Lock()
+        self._flight = SingleFlight()
+        self._clients = OrderedDict()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self._clients),
+                "max_size": self.max_size,
+                "created": self.created,
+                "reused": self.reused,
+                "evicted": self.evicted
+            }
+
+
+def make_http_session(api_key, pool_maxsize=10):
+    """A requests.Session that keeps connections to api.twelvelabs.io alive for one API key."""
+    session = requests.Session()
+    session.headers.update({
+        "x-api-key": api_key,
+        "Accept": "application/json"
+    })
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_maxsize)
+    session.mount("https://", adapter)
+    return session
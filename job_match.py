@@ -0,0 +1,141 @@
+import re
+import math
+from collections import Counter
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "has", "have", "in", "is", "it",
+    "its", "of", "on", "or", "our", "that", "the", "their", "this", "to", "we", "will", "with", "you",
+    "your", "who", "can", "all", "any", "not", "but", "about", "into", "than", "such", "also", "must",
+    "should", "would", "work", "working", "team", "role", "job", "experience", "years", "year",
+    "ability", "strong", "skills", "including", "etc", "plus", "using", "use", "new", "well", "good",
+    "looking", "candidate", "responsibilities", "requirements", "preferred", "required",
+    "need", "needs", "developer", "developers", "engineer", "engineers", "knowledge", "familiarity",
+    "understanding", "proficiency", "proficient", "nice", "hands", "minimum", "least", "environment",
+    "opportunity", "join", "help", "like", "based", "ideal", "excellent", "solid", "equivalent", "degree"
+}
+
+# Alternate spellings mapped to one canonical skill name
+SKILL_ALIASES = {
+    "js": "javascript", "javascript": "javascript", "ts": "typescript", "typescript": "typescript",
+    "py": "python", "python": "python", "python3": "python", "golang": "go",
+    "node": "node.js", "nodejs": "node.js", "node.js": "node.js",
+    "react": "react", "reactjs": "react", "react.js": "react",
+    "vue": "vue", "vuejs": "vue", "vue.js": "vue", "angular": "angular", "angularjs": "angular",
+    "k8s": "kubernetes", "kubernetes": "kubernetes", "docker": "docker",
+    "aws": "aws", "amazon web services": "aws", "gcp": "gcp", "google cloud": "gcp", "azure": "azure",
+    "postgres": "postgresql", "postgresql": "postgresql", "mysql": "mysql", "mongo": "mongodb",
+    "mongodb": "mongodb", "redis": "redis", "sql": "sql", "nosql": "nosql",
+    "ml": "machine learning", "machine learning": "machine learning",
+    "dl": "deep learning", "deep learning": "deep learning", "ai": "ai", "nlp": "nlp",
+    "natural language processing": "nlp", "computer vision": "computer vision",
+    "ci/cd": "ci-cd", "ci-cd": "ci-cd", "cicd": "ci-cd", "devops": "devops",
+    "java": "java", "c++": "c++", "cpp": "c++", "c#": "c#", "csharp": "c#", "rust": "rust",
+    "go": "go", "kotlin": "kotlin", "swift": "swift", "scala": "scala", "ruby": "ruby", "php": "php",
+    "html": "html", "css": "css", "graphql": "graphql", "rest": "rest", "restful": "rest",
+    "django": "django", "flask": "flask", "fastapi": "fastapi", "spring": "spring",
+    "pandas": "pandas", "numpy": "numpy", "pytorch": "pytorch", "tensorflow": "tensorflow",
+    "spark": "spark", "hadoop": "hadoop", "kafka": "kafka", "airflow": "airflow",
+    "tableau": "tableau", "power bi": "power bi", "powerbi": "power bi", "excel": "excel",
+    "git": "git", "linux": "linux", "terraform": "terraform", "jenkins": "jenkins",
+    "agile": "agile", "scrum": "scrum", "jira": "jira",
+    "project management": "project management", "product management": "product management",
+    "data analysis": "data analysis", "data science": "data science",
+    "communication": "communication", "leadership": "leadership", "stakeholder management": "stakeholder management"
+}
+_PHRASES = {alias for alias in SKILL_ALIASES if " " in alias}
+_MAX_PHRASE_WORDS = max(len(p.split()) for p in _PHRASES)
+SKILLS = set(SKILL_ALIASES.values())
+
+# Share of a JD term's weight earned by its first mention in a resume; the rest
+# is earned by repeat mentions, in full at TF_CAP mentions
+COVERAGE_CREDIT = 0.9
+TF_CAP = 2
+
+_TOKEN = re.compile(r"[a-z][a-z0-9+#]*(?:[./\-][a-z0-9+#]+)*")
+
+
+def tokenize(text):
+    """Lowercase word tokens, keeping tech-style names like c++, c#, node.js and ci/cd intact.
+
+    Other slash-joined words ("python/django", "aws/gcp") are split into
+    their parts.
+    """
+    tokens = []
+    for token in _TOKEN.findall((text or "").lower()):
+        if "/" in token and token not in SKILL_ALIASES:
+            tokens.extend(part for part in token.split("/") if part)
+        else:
+            tokens.append(token)
+    return tokens
+
+
+def normalize_terms(text):
+    """Tokenize and canonicalize text: known multi-word skills become one term and aliases map to their skill name."""
+    tokens = tokenize(text)
+    terms = []
+    i = 0
+    while i < len(tokens):
+        for size in range(min(_MAX_PHRASE_WORDS, len(tokens) - i), 1, -1):
+            phrase = " ".join(tokens[i:i + size])
+            if phrase in _PHRASES:
+                terms.append(SKILL_ALIASES[phrase])
+                i += size
+                break
+        else:
+            terms.append(SKILL_ALIASES.get(tokens[i], tokens[i]))
+            i += 1
+    return terms
+
+
+class JobDescription:
+    """A job description parsed once and shared across every resume it is matched against.
+
+    `terms` weights each meaningful JD term by (1 + log tf), doubled for
+    terms in the skill dictionary; `keywords` lists those same terms,
+    heaviest first.
+    """
+
+    def __init__(self, text, max_prompt_chars=4000, max_terms=40):
+        self.text = re.sub(r"\s+", " ", text or "").strip()
+        self.prompt_text = self.text[:max_prompt_chars]
+
+        counts = Counter(t for t in normalize_terms(self.text) if t not in STOPWORDS and len(t) > 1)
+        weighted = {
+            term: (1 + math.log(tf)) * (2.0 if term in SKILLS else 1.0)
+            for term, tf in counts.items()
+        }
+        self.terms = dict(sorted(weighted.items(), key=lambda kv: kv[1], reverse=True)[:max_terms])
+        self.keywords = list(self.terms)
+
+    def score(self, resume_text, max_missing=10):
+        """Score how well resume_text covers this job description, locally and in milliseconds.
+
+        Mostly coverage: a JD term found in the resume earns COVERAGE_CREDIT
+        of its weight on its first mention and the rest by TF_CAP mentions,
+        so a resume naming every term once scores 90 and one that leans on
+        every term scores 100. Returns {"score": 0-100,
+        "missing_keywords": [...], "matched_keywords": [...]}, with missing
+        skills listed before other missing terms.
+        """
+        if not self.terms:
+            return {"score": 0, "missing_keywords": [], "matched_keywords": []}
+
+        resume_counts = Counter(normalize_terms(resume_text))
+        total = sum(self.terms.values())
+        earned = 0.0
+        matched = []
+        missing = []
+        for term, weight in self.terms.items():
+            tf = resume_counts.get(term, 0)
+            if tf:
+                earned += weight * (COVERAGE_CREDIT + (1 - COVERAGE_CREDIT) * (min(tf, TF_CAP) - 1) / (TF_CAP - 1))
+                matched.append(term)
+            else:
+                missing.append(term)
+
+        missing.sort(key=lambda t: (t not in SKILLS, -self.terms[t]))
+        return {
+            "score": round(100 * earned / total),
+            "missing_keywords": missing[:max_missing],
+            "matched_keywords": matched
+        }
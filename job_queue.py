@@ -0,0 +1,267 @@
+import time
+import uuid
+import datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+TERMINAL_STATUSES = (JOB_DONE, JOB_FAILED)
+
+# Returned by a job function that has arranged for JobQueue.resume() to finish the job later
+JOB_DEFERRED = object()
+
+
+# Streaming events that only matter while a job runs; dropped once it finishes
+TRANSIENT_STAGES = ("gemini_chunk",)
+
+
+def _expired(job):
+    expires_at = job.get("expires_at")
+    return expires_at is not None and expires_at < datetime.datetime.utcnow()
+
+
+class InMemoryJobStore:
+    """Thread-safe job store kept in process memory.
+
+    Only suitable for a single worker process: a job is invisible to every
+    other process. Any object exposing create/get/update/append_event/
+    events_since/drop_events with the same signatures can be passed to
+    JobQueue instead (e.g. MongoJobStore, or a stub in tests). Jobs whose
+    `expires_at` has passed are removed.
+    """
+
+    def __init__(self):
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def create(self, job):
+        with self._lock:
+            for job_id in [k for k, v in self._jobs.items() if _expired(v)]:
+                del self._jobs[job_id]
+            self._jobs[job["id"]] = dict(job, events=[], event_count=0)
+
+    def _live(self, job_id):
+        job = self._jobs.get(job_id)
+        return None if job is None or _expired(job) else job
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._live(job_id)
+            if not job:
+                return None
+            job = dict(job)
+            job.pop("events")
+            job.pop("event_count")
+            return job
+
+    def append_event(self, job_id, event):
+        with self._lock:
+            job = self._live(job_id)
+            if job:
+                job["event_count"] += 1
+                event["seq"] = job["event_count"]
+                job["events"].append(event)
+
+    def events_since(self, job_id, after=0):
+        with self._lock:
+            job = self._live(job_id)
+            return [e for e in job["events"] if e["seq"] > after] if job else []
+
+    def drop_events(self, job_id, stages):
+        with self._lock:
+            job = self._live(job_id)
+            if job:
+                job["events"] = [e for e in job["events"] if e["stage"] not in stages]
+
+    def update(self, job_id, **fields):
+        with self._lock:
+            job = self._live(job_id)
+            if job:
+                job.update(fields)
+
+
+class MongoJobStore:
+    """Job store in a Mongo collection, shared by every worker process.
+
+    Events live in an array on the job document. append_event assigns the
+    next sequence number and pushes the event in a single update, so
+    concurrent publishers never reuse or reorder a seq. A TTL index on
+    `expires_at` removes finished jobs.
+    """
+
+    def __init__(self, collection):
+        self.collection = collection
+        self._indexed = False
+
+    def _ensure_index(self):
+        if self._indexed:
+            return
+        try:
+            self.collection.create_index("expires_at", expireAfterSeconds=0)
+            self._indexed = True
+        except Exception as e:
+            print(f"Error creating jobs index: {e}")
+
+    def create(self, job):
+        self._ensure_index()
+        doc = dict(job, events=[], event_count=0)
+        doc["_id"] = doc.pop("id")
+        self.collection.insert_one(doc)
+
+    def _live(self, doc):
+        # The TTL monitor runs about once a minute; don't serve jobs it hasn't reached yet
+        if doc is None or _expired(doc):
+            return None
+        doc["id"] = doc.pop("_id")
+        return doc
+
+    def get(self, job_id):
+        return self._live(self.collection.find_one({"_id": job_id}, {"events": 0, "event_count": 0}))
+
+    def append_event(self, job_id, event):
+        self.collection.update_one({"_id": job_id}, [{"$set": {
+            "event_count": {"$add": ["$event_count", 1]},
+            "events": {"$concatArrays": ["$events", [{"$mergeObjects": [
+                # $literal keeps event text such as "$5k" from being read as a field path
+                {"$literal": event},
+                {"seq": {"$add": ["$event_count", 1]}}
+            ]}]]}
+        }}])
+
+    def events_since(self, job_id, after=0):
+        doc = self.collection.find_one({"_id": job_id}, {
+            "expires_at": 1,
+            "events": {"$filter": {"input": "$events", "cond": {"$gt": ["$$this.seq", after]}}}
+        })
+        doc = self._live(doc)
+        return doc["events"] if doc else []
+
+    def drop_events(self, job_id, stages):
+        self.collection.update_one({"_id": job_id}, {"$pull": {"events": {"stage": {"$in": list(stages)}}}})
+
+    def update(self, job_id, **fields):
+        self.collection.update_one({"_id": job_id}, {"$set": fields})
+
+
+class JobQueue:
+    """Runs long pipeline functions on a worker pool and tracks their state.
+
+    Pipelines report progress with publish(); listeners read it back with
+    events(), which blocks until something new happens. Finished jobs are
+    kept for `retention_seconds`, without their transient streaming events.
+    A job function that waits on something external can return JOB_DEFERRED
+    to free its worker; the job stays running until a later resume() call
+    finishes it.
+    """
+
+    def __init__(self, store=None, max_workers=4, retention_seconds=60 * 60, poll_interval=1.0):
+        self.store = store or InMemoryJobStore()
+        self.retention_seconds = retention_seconds
+        self.poll_interval = poll_interval
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self._changed = threading.Condition()
+        self._published = 0
+
+    def submit(self, func, *args, owner=None, **kwargs):
+        """Queue func(job_id, *args, **kwargs) and return the new job ID."""
+        job_id = uuid.uuid4().hex
+        self.store.create({
+            "id": job_id,
+            "owner": owner,
+            "status": JOB_QUEUED,
+            "result": None,
+            "error": None,
+            "created_at": datetime.datetime.now().isoformat(),
+            "finished_at": None
+        })
+        self.publish(job_id, JOB_QUEUED)
+        self._executor.submit(self._run, job_id, func, args, kwargs)
+        return job_id
+
+    def get(self, job_id):
+        return self.store.get(job_id)
+
+    def publish(self, job_id, stage, **data):
+        """Record a progress event for job_id and wake any listeners."""
+        self.store.append_event(job_id, {
+            "stage": stage,
+            "data": data,
+            "at": datetime.datetime.now().isoformat()
+        })
+        with self._changed:
+            self._published += 1
+            self._changed.notify_all()
+
+    def events(self, job_id, after=0, heartbeat=15, timeout=None):
+        """Yield job_id's events after sequence number `after` as they happen.
+
+        Yields None every `heartbeat` seconds without news so callers can keep
+        a connection alive. Stops once the job has finished and every event
+        has been delivered. Publishes from this process wake the listener
+        at once; a job running in another process is picked up within
+        `poll_interval` seconds. With `timeout`, also stops after that many
+        seconds even if the job is still running.
+        """
+        quiet_since = time.monotonic()
+        deadline = None if timeout is None else quiet_since + timeout
+        while deadline is None or time.monotonic() < deadline:
+            # Store reads happen outside the condition so publish() never waits on them;
+            # the counter catches a publish that lands between the read and the wait
+            with self._changed:
+                published = self._published
+            new_events = self.store.events_since(job_id, after)
+            if not new_events:
+                job = self.store.get(job_id)
+                if job is None or job["status"] in TERMINAL_STATUSES:
+                    return
+                with self._changed:
+                    if self._published == published:
+                        self._changed.wait(self.poll_interval)
+                new_events = self.store.events_since(job_id, after)
+
+            if new_events:
+                quiet_since = time.monotonic()
+            elif time.monotonic() - quiet_since >= heartbeat:
+                quiet_since = time.monotonic()
+                yield None
+            for event in new_events:
+                after = event["seq"]
+                yield event
+
+    def _finish(self, job_id, status, **fields):
+        # The final result carries everything the streaming events did, so they can go
+        self.store.drop_events(job_id, TRANSIENT_STAGES)
+        self.store.update(
+            job_id,
+            status=status,
+            finished_at=datetime.datetime.now().isoformat(),
+            expires_at=datetime.datetime.utcnow() + datetime.timedelta(seconds=self.retention_seconds),
+            **fields
+        )
+
+    def resume(self, job_id, func, *args, **kwargs):
+        """Queue func(job_id, *args, **kwargs) to continue a deferred job; its outcome finishes the job."""
+        self._executor.submit(self._call, job_id, func, args, kwargs)
+
+    def _run(self, job_id, func, args, kwargs):
+        self.store.update(job_id, status=JOB_RUNNING)
+        self.publish(job_id, JOB_RUNNING)
+        self._call(job_id, func, args, kwargs)
+
+    def _call(self, job_id, func, args, kwargs):
+        try:
+            result = func(job_id, *args, **kwargs)
+            if result is JOB_DEFERRED:
+                return
+            self._finish(job_id, JOB_DONE, result=result)
+            self.publish(job_id, JOB_DONE)
+        except Exception as e:
+            print(f"Job {job_id} failed: {e}")
+            self._finish(job_id, JOB_FAILED, error=str(e))
+            self.publish(job_id, JOB_FAILED, error=str(e))
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
@@ -0,0 +1,142 @@
+import re
+import time
+import hashlib
+import threading
+
+from cache import TTLCache, MongoCacheStore
+
+
+def normalize_prompt(prompt):
+    """Collapse whitespace so prompts that differ only in indentation share a cache entry."""
+    return re.sub(r"\s+", " ", prompt).strip()
+
+
+class MongoLLMStore(MongoCacheStore):
+    """Persistent response tier for CachedLLM; entries are shared between workers."""
+
+    field = "text"
+
+
+class CachedLLM:
+    """Wraps a Gemini GenerativeModel with a prompt-hash response cache.
+
+    Lookups go to the in-memory LRU first, then to the optional persistent
+    `store`, and only then to the model. generate() returns the response text.
+    Pass `model_factory` instead of `model` to build the model on the first
+    call that needs it.
+    """
+
+    def __init__(self, model=None, cache=None, store=None, model_name="", model_factory=None):
+        self._model = model
+        self._model_factory = model_factory
+        self.model_name = model_name
+        self.cache = cache or TTLCache(max_entries=512, ttl_seconds=24 * 60 * 60)
+        self.store = store
+        self._lock = threading.Lock()
+        self.store_hits = 0
+        self.model_calls = 0
+        self.model_seconds = 0.0
+
+    @property
+    def model(self):
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    self._model = self._model_factory()
+        return self._model
+
+    def reset_after_fork(self):
+        """Drop a model inherited from a parent process so this one builds its own client."""
+        self._lock = threading.Lock()
+        if self._model_factory is not None:
+            self._model = None
+
+    def cache_key(self, prompt, json_mode=False):
+        normalized = normalize_prompt(prompt)
+        mode = "json" if json_mode else "text"
+        return hashlib.sha256(f"{self.model_name}\n{mode}\n{normalized}".encode("utf-8")).hexdigest()
+
+    def _generation_config(self, json_mode):
+        # Ask Gemini for syntactically valid JSON instead of prose around a JSON block
+        return {"response_mime_type": "application/json"} if json_mode else None
+
+    def forget(self, prompt, json_mode=False):
+        """Drop a cached response, e.g. one that turned out to be unusable."""
+        key = self.cache_key(prompt, json_mode)
+        self.cache.delete(key)
+        if self.store is not None:
+            try:
+                self.store.delete(key)
+            except Exception as e:
+                print(f"Error deleting from LLM cache store: {e}")
+
+    def _lookup(self, key):
+        text = self.cache.get(key)
+        if text is not None or self.store is None:
+            return text
+        try:
+            text = self.store.get(key)
+        except Exception as e:
+            print(f"Error reading LLM cache store: {e}")
+            return None
+        if text is not None:
+            with self._lock:
+                self.store_hits += 1
+            self.cache.set(key, text)
+        return text
+
+    def _remember(self, key, text, started):
+        with self._lock:
+            self.model_calls += 1
+            self.model_seconds += time.perf_counter() - started
+        self.cache.set(key, text)
+        if self.store is not None:
+            try:
+                self.store.set(key, text)
+            except Exception as e:
+                print(f"Error writing LLM cache store: {e}")
+
+    def generate(self, prompt, use_cache=True, json_mode=False):
+        key = self.cache_key(prompt, json_mode)
+        if use_cache:
+            text = self._lookup(key)
+            if text is not None:
+                return text
+
+        start = time.perf_counter()
+        response = self.model.generate_content(prompt, generation_config=self._generation_config(json_mode))
+        text = response.text
+        self._remember(key, text, start)
+        return text
+
+    def stream(self, prompt, use_cache=True):
+        """Like generate(), but yields the response text in chunks as the model produces them.
+
+        A cached response is yielded as a single chunk. The full text is
+        cached only once the stream has completed.
+        """
+        key = self.cache_key(prompt)
+        if use_cache:
+            text = self._lookup(key)
+            if text is not None:
+                yield text
+                return
+
+        start = time.perf_counter()
+        chunks = []
+        for chunk in self.model.generate_content(prompt, stream=True):
+            text = chunk.text
+            if text:
+                chunks.append(text)
+                yield text
+        self._remember(key, "".join(chunks), start)
+
+    def stats(self):
+        stats = self.cache.stats()
+        with self._lock:
+            stats.update({
+                "store_hits": self.store_hits,
+                "model_calls": self.model_calls,
+                "avg_model_seconds": round(self.model_seconds / self.model_calls, 3) if self.model_calls else 0.0
+            })
+        return stats
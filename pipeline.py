@@ -0,0 +1,39 @@
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class Pipeline:
+    """Runs pipeline stages, optionally as parallel branches, and records how long each took."""
+
+    def __init__(self):
+        self.timings = {}
+        self._lock = threading.Lock()
+
+    def stage(self, name, func, *args, **kwargs):
+        """Run a single stage and record its duration in seconds under `name`."""
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            elapsed = round(time.perf_counter() - start, 3)
+            with self._lock:
+                self.timings[name] = elapsed
+
+    def run_parallel(self, branches):
+        """Run independent branches concurrently and join their results.
+
+        `branches` maps a branch name to a zero-argument callable. Returns a
+        dict of branch name -> return value. If any branch raises, the first
+        error (in branch order) is re-raised once all branches have finished.
+        """
+        with ThreadPoolExecutor(max_workers=len(branches), thread_name_prefix="branch") as executor:
+            futures = {
+                name: executor.submit(self.stage, name, func)
+                for name, func in branches.items()
+            }
+
+        results = {}
+        for name, future in futures.items():
+            results[name] = future.result()
+        return results
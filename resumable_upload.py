@@ -0,0 +1,181 @@
+import os
+import re
+import json
+import time
+import hashlib
+
+from scratch import ScratchDir, UploadTooLarge, stream_to_file, sweep_stale, scratch_root
+
+UPLOAD_PREFIX = "upload_"
+_UPLOAD_ID = re.compile(r"^upload_[A-Za-z0-9_]+$")
+_CHUNK_NAME = "chunk_{:06d}"
+
+
+class UploadError(Exception):
+    """A client error in the upload protocol; `status` is the HTTP status to answer with."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+class ResumableUploads:
+    """Resumable uploads stored as numbered chunk files in a scratch directory.
+
+    create() fixes the total size and chunk size; every chunk except the
+    last is exactly `chunk_size` bytes and starts at a multiple of it. Each
+    chunk is written to a temporary file, checked against the client's
+    SHA-256 and then renamed into place, so a retried or interrupted PUT
+    never leaves a partial chunk behind and re-sending a chunk is harmless.
+    All upload state lives on disk, so any worker on the same host can
+    serve any chunk; the job started on finalize is visible to every
+    worker as long as the job queue uses a shared store. Uploads untouched
+    for `max_age_seconds` are swept away by create(), at most once every
+    `sweep_interval` seconds per process.
+    """
+
+    def __init__(self, max_size, chunk_size=8 * 1024 * 1024, max_chunk_size=64 * 1024 * 1024, root=None,
+                 max_age_seconds=24 * 60 * 60, sweep_interval=10 * 60):
+        self.max_size = max_size
+        self.chunk_size = chunk_size
+        self.max_chunk_size = max_chunk_size
+        self.root = root or scratch_root()
+        self.max_age_seconds = max_age_seconds
+        self.sweep_interval = sweep_interval
+        self._last_sweep = None
+
+    def _sweep(self):
+        # Workers live for days; without this an abandoned 2GB upload would sit on disk until restart
+        now = time.monotonic()
+        if self._last_sweep is not None and now - self._last_sweep < self.sweep_interval:
+            return
+        self._last_sweep = now
+        removed = sweep_stale(self.max_age_seconds, root=self.root)
+        if removed:
+            print(f"Removed {removed} stale scratch directories")
+
+    def create(self, owner, size, chunk_size=None, metadata=None):
+        """Start an upload of `size` bytes and return its manifest."""
+        self._sweep()
+        chunk_size = chunk_size or self.chunk_size
+        if not isinstance(size, int) or size <= 0:
+            raise UploadError("size must be a positive integer")
+        if size > self.max_size:
+            raise UploadError(f"File exceeds {self.max_size} bytes", status=413)
+        if not isinstance(chunk_size, int) or not 0 < chunk_size <= self.max_chunk_size:
+            raise UploadError(f"chunk_size must be between 1 and {self.max_chunk_size} bytes")
+
+        scratch = ScratchDir(prefix=UPLOAD_PREFIX, root=self.root)
+        manifest = {
+            "upload_id": os.path.basename(scratch.dir),
+            "owner": owner,
+            "size": size,
+            "chunk_size": chunk_size,
+            "chunks": -(-size // chunk_size),
+            "metadata": metadata or {},
+            "created_at": time.time()
+        }
+        with open(scratch.path("manifest.json"), "w") as f:
+            json.dump(manifest, f)
+        return manifest
+
+    def get(self, upload_id, owner):
+        """Return the manifest of an upload owned by `owner`; raises UploadError(404) otherwise."""
+        if not _UPLOAD_ID.match(upload_id or ""):
+            raise UploadError("Upload not found", status=404)
+        try:
+            with open(os.path.join(self.root, upload_id, "manifest.json")) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            raise UploadError("Upload not found", status=404)
+        if manifest["owner"] != owner:
+            raise UploadError("Upload not found", status=404)
+        return manifest
+
+    def _dir(self, manifest):
+        return os.path.join(self.root, manifest["upload_id"])
+
+    def _chunk_length(self, manifest, index):
+        return min(manifest["chunk_size"], manifest["size"] - index * manifest["chunk_size"])
+
+    def write_chunk(self, manifest, offset, stream, checksum):
+        """Store the chunk starting at byte `offset` after verifying its SHA-256 hex digest."""
+        if os.path.exists(os.path.join(self._dir(manifest), "finalized")):
+            raise UploadError("Upload already finalized", status=409)
+        if not checksum:
+            raise UploadError("Missing chunk checksum")
+        if offset < 0 or offset >= manifest["size"] or offset % manifest["chunk_size"]:
+            raise UploadError(f"offset must be a multiple of {manifest['chunk_size']} below {manifest['size']}")
+
+        index = offset // manifest["chunk_size"]
+        expected = self._chunk_length(manifest, index)
+        final_path = os.path.join(self._dir(manifest), _CHUNK_NAME.format(index))
+        tmp_path = f"{final_path}.{os.getpid()}.{time.monotonic_ns()}.tmp"
+        hasher = hashlib.sha256()
+        try:
+            written = stream_to_file(stream, tmp_path, expected, hasher=hasher)
+        except UploadTooLarge:
+            raise UploadError(f"Chunk at offset {offset} must be {expected} bytes")
+        try:
+            if written != expected:
+                raise UploadError(f"Chunk at offset {offset} must be {expected} bytes, got {written}")
+            if hasher.hexdigest() != checksum.strip().lower():
+                raise UploadError(f"Checksum mismatch for chunk at offset {offset}", status=422)
+            os.replace(tmp_path, final_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return self.status(manifest)
+
+    def status(self, manifest):
+        """Return {"upload_id", "size", "chunk_size", "received_bytes", "missing_offsets"}."""
+        names = set(os.listdir(self._dir(manifest)))
+        received = 0
+        missing = []
+        for index in range(manifest["chunks"]):
+            if _CHUNK_NAME.format(index) in names:
+                received += self._chunk_length(manifest, index)
+            else:
+                missing.append(index * manifest["chunk_size"])
+        return {
+            "upload_id": manifest["upload_id"],
+            "size": manifest["size"],
+            "chunk_size": manifest["chunk_size"],
+            "received_bytes": received,
+            "missing_offsets": missing
+        }
+
+    def finalize(self, manifest):
+        """Mark a complete upload as finalized and return its ScratchDir.
+
+        Raises UploadError(409) if chunks are missing or it was already
+        finalized; only one caller can ever succeed.
+        """
+        if self.status(manifest)["missing_offsets"]:
+            raise UploadError("Upload is incomplete", status=409)
+        try:
+            fd = os.open(os.path.join(self._dir(manifest), "finalized"), os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            raise UploadError("Upload already finalized", status=409)
+        os.close(fd)
+        return ScratchDir.open(self._dir(manifest))
+
+    def assemble(self, manifest, dest_path, hasher=None):
+        """Concatenate the chunks into dest_path, deleting each one once copied. Returns the size."""
+        written = 0
+        with open(dest_path, "wb") as out:
+            for index in range(manifest["chunks"]):
+                chunk_path = os.path.join(self._dir(manifest), _CHUNK_NAME.format(index))
+                with open(chunk_path, "rb") as f:
+                    while True:
+                        block = f.read(1024 * 1024)
+                        if not block:
+                            break
+                        out.write(block)
+                        if hasher is not None:
+                            hasher.update(block)
+                        written += len(block)
+                os.remove(chunk_path)
+        if written != manifest["size"]:
+            raise UploadError(f"Assembled {written} bytes, expected {manifest['size']}", status=500)
+        return written
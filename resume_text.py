@@ -0,0 +1,102 @@
+import os
+import re
+
+SECTION_HEADINGS = {
+    "summary", "profile", "objective", "experience", "work experience", "professional experience",
+    "employment", "education", "skills", "technical skills", "projects", "certifications",
+    "awards", "publications", "languages", "interests", "achievements", "volunteering"
+}
+
+PLAIN_TEXT_EXTENSIONS = {".txt", ".text", ".md"}
+SUPPORTED_EXTENSIONS = {".pdf", ".docx"} | PLAIN_TEXT_EXTENSIONS
+
+
+class ExtractionError(Exception):
+    pass
+
+
+def normalize_text(text):
+    text = text.replace("\x00", "")
+    lines = [re.sub(r"[ \t ]+", " ", line).strip() for line in text.splitlines()]
+    # Collapse runs of blank lines to one
+    text = "\n".join(lines)
+    return re.sub(r"\n{3,}", "\n\n", text).strip()
+
+
+def _extract_pdf(path):
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        raise ExtractionError("PDF support requires the 'pypdf' package")
+    reader = PdfReader(path)
+    return [normalize_text(page.extract_text() or "") for page in reader.pages]
+
+
+def _extract_docx(path):
+    try:
+        import docx
+    except ImportError:
+        raise ExtractionError("DOCX support requires the 'python-docx' package")
+    document = docx.Document(path)
+    paragraphs = [p.text for p in document.paragraphs]
+    for table in document.tables:
+        for row in table.rows:
+            paragraphs.append(" | ".join(cell.text for cell in row.cells))
+    return [normalize_text("\n".join(paragraphs))]
+
+
+def _extract_plain(path):
+    with open(path, "rb") as f:
+        raw = f.read()
+    for encoding in ("utf-8", "latin-1"):
+        try:
+            return [normalize_text(raw.decode(encoding))]
+        except UnicodeDecodeError:
+            continue
+    return [normalize_text(raw.decode("utf-8", errors="ignore"))]
+
+
+def split_sections(text):
+    """Split resume text on common headings. Returns [{"heading", "text"}, ...]."""
+    sections = []
+    heading = None
+    lines = []
+    for line in text.splitlines():
+        candidate = line.strip().rstrip(":").lower()
+        if candidate in SECTION_HEADINGS:
+            if lines:
+                sections.append({"heading": heading, "text": "\n".join(lines).strip()})
+            heading = line.strip().rstrip(":")
+            lines = []
+        else:
+            lines.append(line)
+    if lines:
+        sections.append({"heading": heading, "text": "\n".join(lines).strip()})
+    return [s for s in sections if s["text"]]
+
+
+def extract_resume_text(path):
+    """Extract normalized text from a PDF, DOCX or plain-text (.txt/.md) resume.
+
+    Returns {"text", "pages", "sections"}. Raises ExtractionError for
+    unsupported formats or a missing optional parser.
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".pdf":
+        pages = _extract_pdf(path)
+    elif ext == ".docx":
+        pages = _extract_docx(path)
+    elif ext == ".doc":
+        raise ExtractionError("Legacy .doc files are not supported; please upload PDF or DOCX")
+    elif ext in PLAIN_TEXT_EXTENSIONS:
+        pages = _extract_plain(path)
+    else:
+        # Images, RTF, ODT etc. would decode as latin-1 garbage rather than fail
+        raise ExtractionError(f"Unsupported resume format '{ext or 'no extension'}'; please upload PDF, DOCX or TXT")
+
+    text = "\n\n".join(p for p in pages if p)
+    return {
+        "text": text,
+        "pages": pages,
+        "sections": split_sections(text)
+    }
@@ -0,0 +1,126 @@
+import os
+import time
+import shutil
+import tempfile
+
+DEFAULT_SCRATCH_ROOT = os.path.join('uploads', 'scratch')
+CHUNK_SIZE = 1024 * 1024  # 1MB
+
+
+def scratch_root():
+    # Read on use, not at import, so a SCRATCH_DIR loaded from .env afterwards still applies
+    return os.getenv('SCRATCH_DIR', DEFAULT_SCRATCH_ROOT)
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+class ScratchDir:
+    """A private temporary directory for one upload/job.
+
+    Every job gets its own directory so concurrent uploads never share file
+    names. Use it as a context manager, or call cleanup() explicitly when the
+    directory is handed off to a background worker.
+    """
+
+    def __init__(self, prefix="job_", root=None):
+        root = root or scratch_root()
+        os.makedirs(root, exist_ok=True)
+        self.dir = tempfile.mkdtemp(prefix=prefix, dir=root)
+
+    @classmethod
+    def open(cls, path):
+        """Wrap an existing directory, e.g. one created by an earlier request."""
+        scratch = cls.__new__(cls)
+        scratch.dir = path
+        return scratch
+
+    def path(self, name):
+        return os.path.join(self.dir, name)
+
+    def cleanup(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.cleanup()
+
+
+class HashingFileWriter:
+    """A file being written chunk by chunk, hashed and size-checked as each chunk arrives.
+
+    Handed to Werkzeug as the destination for an uploaded file part, so the
+    part goes straight to dest_path while the request body is being read.
+    Raises UploadTooLarge (and removes the partial file) as soon as more
+    than max_bytes have been written. Other file methods go to the
+    underlying file.
+    """
+
+    def __init__(self, dest_path, max_bytes, hasher=None):
+        self.path = dest_path
+        self.max_bytes = max_bytes
+        self.hasher = hasher
+        self.written = 0
+        self._file = open(dest_path, "w+b")
+
+    def write(self, data):
+        self.written += len(data)
+        if self.written > self.max_bytes:
+            self._file.close()
+            os.remove(self.path)
+            raise UploadTooLarge(f"File exceeds {self.max_bytes} bytes")
+        if self.hasher is not None:
+            self.hasher.update(data)
+        return self._file.write(data)
+
+    def __getattr__(self, name):
+        return getattr(self._file, name)
+
+
+def stream_to_file(stream, dest_path, max_bytes, chunk_size=CHUNK_SIZE, hasher=None):
+    """Copy a file-like stream to dest_path in chunks, stopping as soon as max_bytes is exceeded.
+
+    If a hashlib object is given as `hasher` it is updated with every chunk,
+    so the content hash comes for free with the copy. Returns the number of
+    bytes written. Raises UploadTooLarge (and removes the partial file) if the
+    stream is larger than max_bytes.
+    """
+    written = 0
+    try:
+        with open(dest_path, "wb") as f:
+            while True:
+                chunk = stream.read(chunk_size)
+                if not chunk:
+                    break
+                written += len(chunk)
+                if written > max_bytes:
+                    raise UploadTooLarge(f"File exceeds {max_bytes} bytes")
+                f.write(chunk)
+                if hasher is not None:
+                    hasher.update(chunk)
+    except Exception:
+        if os.path.exists(dest_path):
+            os.remove(dest_path)
+        raise
+    return written
+
+
+def sweep_stale(max_age_seconds, root=None):
+    """Remove scratch directories left behind by crashed or killed workers."""
+    root = root or scratch_root()
+    if not os.path.isdir(root):
+        return 0
+    cutoff = time.time() - max_age_seconds
+    removed = 0
+    for name in os.listdir(root):
+        path = os.path.join(root, name)
+        try:
+            if os.path.isdir(path) and os.path.getmtime(path) < cutoff:
+                shutil.rmtree(path, ignore_errors=True)
+                removed += 1
+        except OSError as e:
+            print(f"Error sweeping scratch dir {path}: {e}")
+    return removed
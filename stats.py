@@ -0,0 +1,183 @@
+import hashlib
+import datetime
+
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+STAT_METRICS = ["confidence", "clarity", "speech_rate", "eye_contact", "body_language", "voice_tone"]
+RECENT_LIMIT = 50
+
+
+def question_key(question):
+    # Question text can contain '.' or '$', so rollup fields are keyed by a hash
+    return hashlib.sha1((question or "").encode("utf-8")).hexdigest()[:16]
+
+
+def _score(value):
+    try:
+        return float(value or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+class UserStats:
+    """Per-user performance rollups, kept up to date as interview results are stored.
+
+    One document per email in `stats_collection` holds running counts, metric
+    sums, per-question bests and the most recent scores, so reading stats is a
+    single find_one no matter how long the user's history is. If a rollup is
+    missing it is rebuilt from `results_collection` with an aggregation.
+    Every update bumps the rollup's `version`, and a rebuild only writes if
+    the version it started from is still current. Timestamps are UTC.
+    """
+
+    def __init__(self, stats_collection, results_collection):
+        self.stats = stats_collection
+        self.results = results_collection
+
+    def _update(self, question, processed_data, created_at):
+        scores = {m: _score(processed_data.get(m)) for m in STAT_METRICS}
+        qkey = question_key(question)
+
+        inc = {"count": 1, "version": 1, f"questions.{qkey}.count": 1}
+        best = {}
+        for metric, value in scores.items():
+            inc[f"sums.{metric}"] = value
+            inc[f"questions.{qkey}.sums.{metric}"] = value
+            best[f"questions.{qkey}.best.{metric}"] = value
+
+        return {
+            "$inc": inc,
+            "$max": best,
+            "$set": {f"questions.{qkey}.question": question, "updated_at": created_at},
+            "$push": {"recent": {
+                "$each": [{"question": question, "at": created_at, "scores": scores}],
+                "$slice": -RECENT_LIMIT
+            }}
+        }
+
+    def record(self, email, question, processed_data, created_at=None):
+        """Fold one stored result into the user's rollup; pass the result's _id.generation_time as created_at."""
+        created_at = created_at or datetime.datetime.utcnow()
+        update = self.stats.update_one({"_id": email}, self._update(question, processed_data, created_at))
+        if update.matched_count == 0:
+            # First result since rollups were introduced: build from full history
+            # (which already contains this result) rather than start from zero
+            self.rebuild(email)
+
+    def record_many(self, entries):
+        """Fold several stored results, as (email, question, processed_data, created_at) tuples, in one bulk write."""
+        emails = {entry[0] for entry in entries}
+        existing = {doc["_id"] for doc in self.stats.find({"_id": {"$in": list(emails)}}, {"_id": 1})}
+        ops = [
+            UpdateOne({"_id": email}, self._update(question, processed_data, created_at or datetime.datetime.utcnow()))
+            for email, question, processed_data, created_at in entries
+            if email in existing
+        ]
+        if ops:
+            self.stats.bulk_write(ops, ordered=True)
+        for email in emails - existing:
+            self.rebuild(email)
+
+    def rebuild(self, email, attempts=5):
+        """Recompute the rollup for email from its results with a server-side aggregation.
+
+        Retried if another rebuild or record() changes the rollup in the
+        meantime, so neither can overwrite the other's update.
+        """
+        for _ in range(attempts):
+            current = self.stats.find_one({"_id": email}, {"version": 1})
+            rollup = self._aggregate(email)
+            if current is None:
+                rollup["version"] = 1
+                try:
+                    self.stats.insert_one({"_id": email, **rollup})
+                except DuplicateKeyError:
+                    continue
+                return {"_id": email, **rollup}
+            # {"version": None} also matches rollups written before versions existed
+            rollup["version"] = (current.get("version") or 0) + 1
+            if self.stats.replace_one({"_id": email, "version": current.get("version")}, rollup).matched_count:
+                return {"_id": email, **rollup}
+        print(f"Stats rollup for {email} kept changing; gave up rebuilding after {attempts} attempts")
+        return {"_id": email, **rollup}
+
+    def _aggregate(self, email):
+        sums = {m: {"$sum": f"$results.{m}"} for m in STAT_METRICS}
+        bests = {f"best_{m}": {"$max": f"$results.{m}"} for m in STAT_METRICS}
+        facets = list(self.results.aggregate([
+            {"$match": {"email": email}},
+            {"$facet": {
+                "overall": [{"$group": {"_id": None, "count": {"$sum": 1}, **sums}}],
+                "questions": [{"$group": {"_id": "$question", "count": {"$sum": 1}, **sums, **bests}}],
+                "recent": [
+                    {"$sort": {"_id": -1}},
+                    {"$limit": RECENT_LIMIT},
+                    {"$project": {"question": 1, "results": 1}}
+                ]
+            }}
+        ]))
+        facet = facets[0] if facets else {"overall": [], "questions": [], "recent": []}
+        overall = facet["overall"][0] if facet["overall"] else {"count": 0}
+
+        questions = {}
+        for row in facet["questions"]:
+            questions[question_key(row["_id"])] = {
+                "question": row["_id"],
+                "count": row["count"],
+                "sums": {m: _score(row.get(m)) for m in STAT_METRICS},
+                "best": {m: _score(row.get(f"best_{m}")) for m in STAT_METRICS}
+            }
+
+        recent = [
+            {
+                "question": row.get("question"),
+                "at": row["_id"].generation_time.replace(tzinfo=None),
+                "scores": {m: _score((row.get("results") or {}).get(m)) for m in STAT_METRICS}
+            }
+            for row in reversed(facet["recent"])
+        ]
+
+        return {
+            "count": overall["count"],
+            "sums": {m: _score(overall.get(m)) for m in STAT_METRICS},
+            "questions": questions,
+            "recent": recent,
+            "updated_at": datetime.datetime.utcnow()
+        }
+
+    def get(self, email):
+        """Return averages, per-question averages/bests and the recent trend for email."""
+        rollup = self.stats.find_one({"_id": email}) or self.rebuild(email)
+        count = rollup.get("count", 0)
+
+        def averages(sums, n):
+            return {m: round(sums.get(m, 0) / n, 2) if n else 0 for m in STAT_METRICS}
+
+        questions = [
+            {
+                "question": q["question"],
+                "count": q["count"],
+                "averages": averages(q.get("sums", {}), q["count"]),
+                "best": q.get("best", {})
+            }
+            for q in rollup.get("questions", {}).values()
+        ]
+        questions.sort(key=lambda q: q["count"], reverse=True)
+
+        trend = [
+            {
+                "question": point["question"],
+                "at": (point["at"].replace(tzinfo=datetime.timezone.utc).isoformat()
+                       if isinstance(point["at"], datetime.datetime) else point["at"]),
+                "scores": point["scores"]
+            }
+            for point in rollup.get("recent", [])
+        ]
+
+        return {
+            "total_interviews": count,
+            "averages": averages(rollup.get("sums", {}), count),
+            "questions": questions,
+            "trend": trend
+        }
@@ -0,0 +1,114 @@
+import re
+import json
+
+_NUMBER = re.compile(r"^\s*(-?\d+(?:\.\d+)?)\s*(?:/\s*\d+(?:\.\d+)?|%)?\s*$")
+
+
+class JSONObjectScanner:
+    """Finds complete top-level {...} objects in text that may arrive in chunks.
+
+    Tracks brace depth while skipping braces inside JSON strings, so each
+    character is looked at once no matter how the text is split.
+    """
+
+    def __init__(self):
+        self._buffer = []
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self.offset = 0  # characters consumed so far
+        self._start = None
+
+    def feed(self, chunk):
+        """Consume a chunk and return a list of (start_offset, object_text) completed by it."""
+        found = []
+        for ch in chunk:
+            if self._depth > 0:
+                self._buffer.append(ch)
+                if self._in_string:
+                    if self._escape:
+                        self._escape = False
+                    elif ch == "\\":
+                        self._escape = True
+                    elif ch == '"':
+                        self._in_string = False
+                elif ch == '"':
+                    self._in_string = True
+                elif ch == "{":
+                    self._depth += 1
+                elif ch == "}":
+                    self._depth -= 1
+                    if self._depth == 0:
+                        found.append((self._start, "".join(self._buffer)))
+                        self._buffer = []
+            elif ch == "{":
+                self._depth = 1
+                self._start = self.offset
+                self._buffer = [ch]
+            self.offset += 1
+        return found
+
+
+def extract_json(text):
+    """Return (obj, start, end) for the first top-level JSON object in text that parses, or (None, -1, -1)."""
+    scanner = JSONObjectScanner()
+    for start, candidate in scanner.feed(text):
+        try:
+            obj = json.loads(candidate)
+        except json.JSONDecodeError:
+            continue
+        if isinstance(obj, dict):
+            return obj, start, start + len(candidate)
+    return None, -1, -1
+
+
+def coerce_number(value):
+    """Turn 7, "7", "7.5", "7/10" or "70%" into a number; None if it isn't one."""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return value
+    if isinstance(value, str):
+        match = _NUMBER.match(value)
+        if match:
+            number = float(match.group(1))
+            return int(number) if number.is_integer() else number
+    return None
+
+
+def validate(data, schema):
+    """Coerce data to schema, filling defaults for missing or invalid fields.
+
+    `schema` maps field name -> (kind, default) where kind is "number",
+    "string", "list", or a nested schema dict. Fields not in the schema are
+    kept as-is. Returns (clean_data, errors) with one message per field that
+    had to fall back to its default.
+    """
+    clean = dict(data) if isinstance(data, dict) else {}
+    errors = []
+    for field, (kind, default) in schema.items():
+        value = clean.get(field)
+        if isinstance(kind, dict):
+            if isinstance(value, dict):
+                clean[field], nested_errors = validate(value, kind)
+                errors.extend(f"{field}.{e}" for e in nested_errors)
+                continue
+            ok = False
+        elif kind == "number":
+            value = coerce_number(value)
+            ok = value is not None
+        elif kind == "string":
+            ok = isinstance(value, str)
+        elif kind == "list":
+            if isinstance(value, str):
+                value = [value]
+            ok = isinstance(value, list)
+        else:
+            raise ValueError(f"Unknown schema kind {kind!r}")
+
+        if ok:
+            clean[field] = value
+        else:
+            clean[field] = default() if callable(default) else default
+            errors.append(f"{field}: expected {kind if isinstance(kind, str) else 'object'}")
+    return clean, errors
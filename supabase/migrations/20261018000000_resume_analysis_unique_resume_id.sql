@@ -0,0 +1,11 @@
+-- save_resume_analysis upserts on resume_id, which requires a unique constraint.
+-- Keep only the newest analysis of each resume before adding it.
+delete from resume_analysis
+where ctid not in (
+    select distinct on (resume_id) ctid
+    from resume_analysis
+    order by resume_id, created_at desc nulls last
+);
+
+alter table resume_analysis
+    add constraint resume_analysis_resume_id_key unique (resume_id);
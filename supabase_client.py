@@ -1,7 +1,11 @@
 import os
 import json
-from supabase import create_client, Client
+import time
+import base64
+import hashlib
+import threading
 from dotenv import load_dotenv
+from write_behind import WriteBehindBuffer
 
 # Load environment variables
 load_dotenv()
@@ -10,27 +14,141 @@ load_dotenv()
 SUPABASE_URL = os.getenv('SUPABASE_URL')
 SUPABASE_KEY = os.getenv('SUPABASE_KEY')
 SUPABASE_SERVICE_KEY = os.getenv('SUPABASE_SERVICE_KEY')
+# Legacy projects sign access tokens with this HS256 secret; newer ones publish signing keys as JWKS
+SUPABASE_JWT_SECRET = os.getenv('SUPABASE_JWT_SECRET')
+SUPABASE_JWT_AUDIENCE = os.getenv('SUPABASE_JWT_AUDIENCE', 'authenticated')
+# Upper bound on how long a verified token is trusted without re-checking (never past its exp)
+JWT_CACHE_TTL = int(os.getenv('JWT_CACHE_TTL', 300))
+JWT_CACHE_MAX = 10000
+# Buffer result/analysis rows and write them in bulk off the request thread
+SUPABASE_WRITE_BEHIND = bool(os.getenv('SUPABASE_WRITE_BEHIND'))
+# Tables whose rows are upserted on this column instead of inserted. Each column needs a
+# unique constraint; see supabase/migrations/20261018000000_resume_analysis_unique_resume_id.sql
+UPSERT_KEYS = {'resume_analysis': 'resume_id'}
 
-# Debug print (remove in production)
-print(f"SUPABASE_URL: {SUPABASE_URL}")
-print(f"SUPABASE_KEY length: {len(SUPABASE_KEY) if SUPABASE_KEY else 'None'}")
+_client = None
+_admin_client = None
+_client_lock = threading.Lock()
 
-# Create Supabase client
-if not SUPABASE_URL or not SUPABASE_KEY:
-    raise ValueError("SUPABASE_URL and SUPABASE_KEY must be set in environment variables")
+def _reset_after_fork():
+    # Clients (and their connection pools) are per process; build fresh ones in each worker
+    global _client, _admin_client, _client_lock
+    _client = None
+    _admin_client = None
+    _client_lock = threading.Lock()
 
-try:
-    supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
-    print("Supabase client created successfully")
-except Exception as e:
-    print(f"Error creating Supabase client: {e}")
-    raise
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+def get_client():
+    """Return the process-wide Supabase client, creating it on first use"""
+    global _client
+    if not SUPABASE_URL or not SUPABASE_KEY:
+        raise ValueError("SUPABASE_URL and SUPABASE_KEY must be set in environment variables")
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                from supabase import create_client
+                _client = create_client(SUPABASE_URL, SUPABASE_KEY)
+    return _client
 
 # Create admin client with service role key for server-side operations
 def get_admin_client():
+    """Return the process-wide admin client, creating it on first use"""
+    global _admin_client
     if not SUPABASE_URL or not SUPABASE_SERVICE_KEY:
         raise ValueError("SUPABASE_URL and SUPABASE_SERVICE_KEY must be set in environment variables")
-    return create_client(SUPABASE_URL, SUPABASE_SERVICE_KEY)
+    if _admin_client is None:
+        with _client_lock:
+            if _admin_client is None:
+                from supabase import create_client
+                _admin_client = create_client(SUPABASE_URL, SUPABASE_SERVICE_KEY)
+    return _admin_client
+
+class VerifiedUser:
+    """The subset of a Supabase User that can be read from a verified access token"""
+    def __init__(self, claims):
+        self.claims = claims
+        self.id = claims.get('sub')
+        self.email = claims.get('email')
+        self.phone = claims.get('phone')
+        self.role = claims.get('role')
+        self.app_metadata = claims.get('app_metadata', {})
+        self.user_metadata = claims.get('user_metadata', {})
+
+# Verified tokens keyed by sha256(token) -> (user, cache_until)
+_verified_tokens = {}
+_verified_tokens_lock = threading.Lock()
+_jwks_client = None
+
+def _cached_user(token_hash):
+    with _verified_tokens_lock:
+        entry = _verified_tokens.get(token_hash)
+        if entry is None:
+            return None
+        user, cache_until = entry
+        if cache_until <= time.time():
+            del _verified_tokens[token_hash]
+            return None
+        return user
+
+def _cache_user(token_hash, user, expires_at):
+    cache_until = min(time.time() + JWT_CACHE_TTL, expires_at or 0)
+    if cache_until <= time.time():
+        return
+    with _verified_tokens_lock:
+        if len(_verified_tokens) >= JWT_CACHE_MAX:
+            # Drop expired entries first, then the oldest ones
+            now = time.time()
+            for key in [k for k, (_, until) in _verified_tokens.items() if until <= now]:
+                del _verified_tokens[key]
+            while len(_verified_tokens) >= JWT_CACHE_MAX:
+                del _verified_tokens[next(iter(_verified_tokens))]
+        _verified_tokens[token_hash] = (user, cache_until)
+
+def _get_jwks_client():
+    """JWKS client for the project's signing keys; PyJWKClient caches keys and refetches on an unknown kid"""
+    global _jwks_client
+    if _jwks_client is None:
+        from jwt import PyJWKClient
+        _jwks_client = PyJWKClient(
+            f"{SUPABASE_URL}/auth/v1/.well-known/jwks.json",
+            cache_keys=True,
+            lifespan=60 * 60
+        )
+    return _jwks_client
+
+def _decode_locally(token):
+    """Verify signature, expiry and audience without a network call (except the occasional JWKS refresh)"""
+    import jwt
+
+    header = jwt.get_unverified_header(token)
+    algorithm = header.get('alg')
+    if algorithm == 'HS256':
+        if not SUPABASE_JWT_SECRET:
+            raise ValueError("SUPABASE_JWT_SECRET is not set")
+        key = SUPABASE_JWT_SECRET
+    else:
+        try:
+            key = _get_jwks_client().get_signing_key_from_jwt(token).key
+        except (jwt.PyJWKClientError, jwt.PyJWKSetError, jwt.PyJWKError) as e:
+            # JWKS unreachable, or no usable key (e.g. 'cryptography' missing for RS256/ES256)
+            raise ValueError(f"signing key unavailable ({e})")
+    return jwt.decode(
+        token,
+        key,
+        algorithms=[algorithm] if algorithm in ('HS256', 'RS256', 'ES256') else [],
+        audience=SUPABASE_JWT_AUDIENCE,
+        options={"require": ["exp", "sub"]}
+    )
+
+def _unverified_exp(token):
+    """The token's exp claim, read without verification; only used to bound how long it is cached"""
+    try:
+        payload = token.split('.')[1]
+        claims = json.loads(base64.urlsafe_b64decode(payload + '=' * (-len(payload) % 4)))
+        return float(claims['exp'])
+    except (IndexError, KeyError, TypeError, ValueError):
+        return None
 
 # Helper functions for authentication
 def verify_jwt(request_or_token):
@@ -49,11 +167,34 @@ def verify_jwt(request_or_token):
             
         if not token:
             return None
+
+        token_hash = hashlib.sha256(token.encode('utf-8')).hexdigest()
+        user = _cached_user(token_hash)
+        if user is not None:
+            return user
+
+        # Verify locally against the project's signing key
+        try:
+            claims = _decode_locally(token)
+        except ImportError:
+            claims = None
+        except ValueError as e:
+            # No local key material configured; fall back to Supabase below
+            print(f"Local JWT verification unavailable: {e}")
+            claims = None
+        if claims is not None:
+            user = VerifiedUser(claims)
+            _cache_user(token_hash, user, claims.get('exp'))
+            return user
         
-        # Use admin client to verify the JWT token
+        # Fall back to asking Supabase to verify the JWT token
         admin_client = get_admin_client()
         response = admin_client.auth.get_user(token)
-        return response.user if response else None
+        user = response.user if response else None
+        if user is not None:
+            # Supabase accepted it, but it must still stop being accepted at its own exp
+            _cache_user(token_hash, user, _unverified_exp(token))
+        return user
     except Exception as e:
         print(f"Error verifying JWT: {e}")
         return None
@@ -62,7 +203,7 @@ def verify_jwt(request_or_token):
 def get_user_profile(user_id):
     """Get user profile from database"""
     try:
-        response = supabase.table('profiles').select('*').eq('id', user_id).execute()
+        response = get_client().table('profiles').select('*').eq('id', user_id).execute()
         return response.data[0] if response.data else None
     except Exception as e:
         print(f"Error getting user profile: {e}")
@@ -71,7 +212,7 @@ def get_user_profile(user_id):
 def update_user_profile(user_id, data):
     """Update user profile in database"""
     try:
-        response = supabase.table('profiles').update(data).eq('id', user_id).execute()
+        response = get_client().table('profiles').update(data).eq('id', user_id).execute()
         return response.data[0] if response.data else None
     except Exception as e:
         print(f"Error updating user profile: {e}")
@@ -80,12 +221,35 @@ def update_user_profile(user_id, data):
 def get_interview_results(user_id):
     """Get all interview results for a user"""
     try:
-        response = supabase.table('interview_results').select('*').eq('user_id', user_id).execute()
+        response = get_client().table('interview_results').select('*').eq('user_id', user_id).execute()
         return response.data
     except Exception as e:
         print(f"Error getting interview results: {e}")
         return []
 
+def _write_rows(table, rows):
+    """Insert (or upsert, per UPSERT_KEYS) rows into table with a single request"""
+    key = UPSERT_KEYS.get(table)
+    if key:
+        # Postgres rejects an upsert that touches the same row twice, so keep the latest row per key
+        rows = list({row[key]: row for row in rows}.values())
+        return get_client().table(table).upsert(rows, on_conflict=key).execute()
+    return get_client().table(table).insert(rows).execute()
+
+_write_buffer = WriteBehindBuffer(_write_rows, name="supabase-writer") if SUPABASE_WRITE_BEHIND else None
+
+def _save_row(table, data):
+    """Write one row now, or queue it when write-behind is enabled (returning the unsaved row)"""
+    if _write_buffer is not None:
+        _write_buffer.add(table, data)
+        return data
+    response = _write_rows(table, [data])
+    return response.data[0] if response.data else None
+
+def flush_writes():
+    """Write out any buffered rows; a no-op unless SUPABASE_WRITE_BEHIND is set"""
+    return _write_buffer.flush() if _write_buffer is not None else 0
+
 def save_interview_result(user_id, question, user_answer, feedback, score):
     """Save interview result to database"""
     try:
@@ -96,8 +260,7 @@ def save_interview_result(user_id, question, user_answer, feedback, score):
             'feedback': feedback,
             'score': score
         }
-        response = supabase.table('interview_results').insert(data).execute()
-        return response.data[0] if response.data else None
+        return _save_row('interview_results', data)
     except Exception as e:
         print(f"Error saving interview result: {e}")
         return None
@@ -105,7 +268,7 @@ def save_interview_result(user_id, question, user_answer, feedback, score):
 def get_resume(user_id, resume_id=None):
     """Get resume data for a user"""
     try:
-        query = supabase.table('resumes').select('*').eq('user_id', user_id)
+        query = get_client().table('resumes').select('*').eq('user_id', user_id)
         if resume_id:
             query = query.eq('id', resume_id)
         response = query.execute()
@@ -123,14 +286,14 @@ def save_resume(user_id, filename, file_path, extracted_text):
             'file_path': file_path,
             'extracted_text': extracted_text
         }
-        response = supabase.table('resumes').insert(data).execute()
+        response = get_client().table('resumes').insert(data).execute()
         return response.data[0] if response.data else None
     except Exception as e:
         print(f"Error saving resume: {e}")
         return None
 
 def save_resume_analysis(resume_id, user_id, analysis_data):
-    """Save resume analysis to database"""
+    """Save resume analysis to database, replacing any earlier analysis of the same resume"""
     try:
         # Extract data from analysis_data object
         analysis = analysis_data.get('analysis', {})
@@ -147,8 +310,7 @@ def save_resume_analysis(resume_id, user_id, analysis_data):
             'score': analysis.get('score', 0),
             'created_at': analysis_data.get('analysis_date')
         }
-        response = supabase.table('resume_analysis').insert(data).execute()
-        return response.data[0] if response.data else None
+        return _save_row('resume_analysis', data)
     except Exception as e:
         print(f"Error saving resume analysis: {e}")
         return None
\ No newline at end of file
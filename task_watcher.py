@@ -0,0 +1,262 @@
+import time
+import heapq
+import random
+import datetime
+import itertools
+import threading
+
+TERMINAL_STATUSES = ("ready", "failed")
+
+
+class MongoTaskSignals:
+    """Completion webhooks shared between worker processes through a Mongo collection.
+
+    A webhook can land on any worker, but only the process that watches the
+    task can act on it, so mark() records it and the watching process
+    collects it with take(). Records nobody collects expire after
+    `ttl_seconds`.
+    """
+
+    def __init__(self, collection, ttl_seconds=60 * 60):
+        self.collection = collection
+        self.ttl_seconds = ttl_seconds
+        self._indexed = False
+
+    def ensure_index(self):
+        try:
+            self.collection.create_index("created_at", expireAfterSeconds=self.ttl_seconds)
+            self._indexed = True
+        except Exception as e:
+            print(f"Error creating task signal index: {e}")
+
+    def mark(self, task_id):
+        if not self._indexed:
+            self.ensure_index()
+        self.collection.update_one(
+            {"_id": task_id},
+            {"$set": {"created_at": datetime.datetime.utcnow()}},
+            upsert=True
+        )
+
+    def take(self, task_ids):
+        """Return the subset of task_ids that were marked, removing their records."""
+        found = [doc["_id"] for doc in self.collection.find({"_id": {"$in": list(task_ids)}}, {"_id": 1})]
+        if found:
+            self.collection.delete_many({"_id": {"$in": found}})
+        return found
+
+
+class _Watch:
+    def __init__(self, client, task_id, interval, on_update, on_done, timeout):
+        self.client = client
+        self.task_id = task_id
+        self.interval = interval
+        self.on_update = on_update
+        self.on_done = on_done
+        self.timeout = timeout
+        self.deadline = None if timeout is None else time.monotonic() + timeout
+        self.task = None
+        self.seq = None
+
+
+class TaskWatcher:
+    """Waits for Twelve Labs indexing tasks using one shared poller thread.
+
+    Each task is polled on its own adaptive schedule: starting at
+    `min_interval`, growing by `backoff` up to `max_interval`, with +/-
+    `jitter` randomization so many tasks do not poll in lockstep. A webhook
+    can call notify(task_id) to have a task re-checked immediately instead
+    of waiting for its next scheduled poll. With a `signals` store (e.g.
+    MongoTaskSignals), webhooks that reach a process not watching the task
+    are recorded there, and every process checks for its own tasks every
+    `signal_interval` seconds.
+    """
+
+    def __init__(self, min_interval=1.0, max_interval=15.0, backoff=1.5, jitter=0.2,
+                 signals=None, signal_interval=2.0):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.jitter = jitter
+        self.signals = signals
+        self.signal_interval = signal_interval
+        self._heap = []
+        self._watches = {}
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._thread = None
+        self._last_signal_check = 0
+        self.polls = 0
+        self.forwarded = 0
+        self.missed = 0
+
+    def watch(self, client, task_id, on_done, timeout=None, on_update=None):
+        """Start watching task_id without blocking the caller.
+
+        on_done(task, error) is called exactly once from the poller thread:
+        with the final Task when it reaches a terminal status, or with
+        (last seen Task or None, TimeoutError) after `timeout` seconds. It
+        should return quickly, e.g. by handing the rest of the work to a
+        queue.
+        """
+        watch = _Watch(client, task_id, self.min_interval, on_update, on_done, timeout)
+        with self._cond:
+            self._watches[task_id] = watch
+            self._schedule(watch, self.min_interval)
+            self._ensure_thread()
+
+    def wait(self, client, task_id, timeout=None, on_update=None):
+        """Block until task_id reaches a terminal status and return the final Task object.
+
+        Raises TimeoutError if it does not finish within `timeout` seconds.
+        """
+        outcome = {}
+        finished = threading.Event()
+
+        def on_done(task, error):
+            outcome.update(task=task, error=error)
+            finished.set()
+
+        self.watch(client, task_id, on_done, timeout=timeout, on_update=on_update)
+        finished.wait()
+        if outcome["error"] is not None:
+            raise outcome["error"]
+        return outcome["task"]
+
+    def notify(self, task_id):
+        """Poll task_id as soon as possible (e.g. on a completion webhook).
+
+        Returns True if this process watches the task. Otherwise the webhook
+        is recorded in the signals store for the process that does, and
+        False is returned.
+        """
+        if self._wake(task_id):
+            return True
+        if self.signals is None:
+            with self._cond:
+                self.missed += 1
+            print(f"Webhook for task {task_id} reached a process that is not watching it")
+            return False
+        try:
+            self.signals.mark(task_id)
+        except Exception as e:
+            print(f"Error recording webhook for task {task_id}: {e}")
+            with self._cond:
+                self.missed += 1
+            return False
+        with self._cond:
+            self.forwarded += 1
+        return False
+
+    def stats(self):
+        with self._cond:
+            return {
+                "in_flight": len(self._watches),
+                "polls": self.polls,
+                "webhooks_forwarded": self.forwarded,
+                "webhooks_missed": self.missed
+            }
+
+    def _wake(self, task_id):
+        with self._cond:
+            watch = self._watches.get(task_id)
+            if watch is None:
+                return False
+            self._schedule(watch, 0)
+            return True
+
+    def _schedule(self, watch, delay):
+        # Only the most recent heap entry for a watch is live; older ones are skipped when popped
+        watch.seq = next(self._seq)
+        due = time.monotonic() + delay
+        if watch.deadline is not None:
+            due = min(due, watch.deadline)
+        heapq.heappush(self._heap, (due, watch.seq, watch))
+        self._cond.notify()
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._loop, name="task-watcher", daemon=True)
+            self._thread.start()
+
+    def _next_signal_check(self):
+        if self.signals is None or not self._watches:
+            return None
+        return self._last_signal_check + self.signal_interval
+
+    def _loop(self):
+        while True:
+            with self._cond:
+                while True:
+                    now = time.monotonic()
+                    wake_at = [t for t in (self._heap[0][0] if self._heap else None, self._next_signal_check())
+                               if t is not None]
+                    if wake_at and min(wake_at) <= now:
+                        break
+                    self._cond.wait(min(wake_at) - now if wake_at else None)
+
+                signal_check = self._next_signal_check()
+                if signal_check is not None and signal_check <= now:
+                    self._last_signal_check = now
+                    task_ids = list(self._watches)
+                    watch = None
+                else:
+                    _, seq, watch = heapq.heappop(self._heap)
+                    # Skip stale heap entries for tasks that finished, gave up, or were re-scheduled by notify()
+                    if seq != watch.seq or self._watches.get(watch.task_id) is not watch:
+                        continue
+                    expired = watch.deadline is not None and now >= watch.deadline
+                    if not expired:
+                        self.polls += 1
+
+            if watch is None:
+                self._collect_signals(task_ids)
+            elif expired:
+                self._complete(watch, TimeoutError(
+                    f"Task {watch.task_id} did not finish within {watch.timeout} seconds"
+                ))
+            else:
+                self._poll(watch)
+
+    def _collect_signals(self, task_ids):
+        try:
+            signalled = self.signals.take(task_ids)
+        except Exception as e:
+            print(f"Error reading task signals: {e}")
+            return
+        for task_id in signalled:
+            self._wake(task_id)
+
+    def _complete(self, watch, error=None):
+        with self._cond:
+            if self._watches.get(watch.task_id) is not watch:
+                return
+            del self._watches[watch.task_id]
+        try:
+            watch.on_done(watch.task, error)
+        except Exception as e:
+            print(f"Error in task completion callback: {e}")
+
+    def _poll(self, watch):
+        try:
+            task = watch.client.task.retrieve(watch.task_id)
+        except Exception as e:
+            print(f"Error polling task {watch.task_id}: {e}")
+            task = None
+
+        if task is not None:
+            watch.task = task
+            if watch.on_update:
+                try:
+                    watch.on_update(task)
+                except Exception as e:
+                    print(f"Error in task update callback: {e}")
+            if task.status in TERMINAL_STATUSES:
+                self._complete(watch)
+                return
+
+        watch.interval = min(watch.interval * self.backoff, self.max_interval)
+        delay = watch.interval * random.uniform(1 - self.jitter, 1 + self.jitter)
+        with self._cond:
+            if self._watches.get(watch.task_id) is watch:
+                self._schedule(watch, delay)
@@ -0,0 +1,83 @@
+import os
+import time
+import subprocess
+
+from transcription import ffmpeg_exe, SAMPLE_RATE
+
+
+class TranscodeError(Exception):
+    pass
+
+
+class VideoNormalizer:
+    """Shrinks an uploaded recording before it is sent to Twelve Labs.
+
+    One ffmpeg pass writes two outputs: an H.264/AAC MP4 capped at
+    `max_height` pixels, `max_fps` frames per second and `max_kbps` kbit/s,
+    with subtitle, data and extra audio/video streams dropped; and the mono
+    16kHz PCM track the transcriber reads, so the video is only decoded once.
+    """
+
+    def __init__(self, max_height=720, max_fps=30, max_kbps=1500, audio_kbps=96,
+                 preset="veryfast", timeout=30 * 60):
+        self.max_height = max_height
+        self.max_fps = max_fps
+        self.max_kbps = max_kbps
+        self.audio_kbps = audio_kbps
+        self.preset = preset
+        self.timeout = timeout
+
+    def command(self, src, video_out, pcm_out):
+        return [
+            ffmpeg_exe(), "-nostdin", "-loglevel", "error", "-y",
+            "-i", src,
+            # Output 1: the video Twelve Labs indexes
+            "-map", "0:v:0", "-map", "0:a:0?",
+            "-vf", f"scale=-2:'min(ih,{self.max_height})'",
+            "-fpsmax", str(self.max_fps),
+            "-c:v", "libx264", "-preset", self.preset, "-crf", "26",
+            "-maxrate", f"{self.max_kbps}k", "-bufsize", f"{2 * self.max_kbps}k",
+            "-pix_fmt", "yuv420p",
+            "-c:a", "aac", "-b:a", f"{self.audio_kbps}k",
+            "-sn", "-dn", "-map_metadata", "-1", "-movflags", "+faststart",
+            video_out,
+            # Output 2: raw PCM for transcription
+            "-map", "0:a:0", "-vn", "-ac", "1", "-ar", str(SAMPLE_RATE),
+            "-f", "s16le", pcm_out
+        ]
+
+    def normalize(self, src, video_out, pcm_out):
+        """Transcode src into video_out and pcm_out.
+
+        Returns {"video_path", "pcm_path", "input_bytes", "output_bytes",
+        "seconds"}. If the re-encoded video is not smaller than the original,
+        the original is kept as video_path. Raises TranscodeError if ffmpeg
+        fails, e.g. for a recording without an audio track.
+        """
+        start = time.perf_counter()
+        input_bytes = os.path.getsize(src)
+        try:
+            proc = subprocess.run(
+                self.command(src, video_out, pcm_out),
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.PIPE,
+                timeout=self.timeout
+            )
+        except (OSError, subprocess.TimeoutExpired) as e:
+            raise TranscodeError(str(e))
+        if proc.returncode != 0:
+            raise TranscodeError(proc.stderr.decode("utf-8", errors="replace").strip()[-500:])
+
+        output_bytes = os.path.getsize(video_out)
+        video_path = video_out
+        if output_bytes >= input_bytes:
+            os.remove(video_out)
+            video_path = src
+            output_bytes = input_bytes
+        return {
+            "video_path": video_path,
+            "pcm_path": pcm_out,
+            "input_bytes": input_bytes,
+            "output_bytes": output_bytes,
+            "seconds": round(time.perf_counter() - start, 3)
+        }
@@ -0,0 +1,194 @@
+import os
+import math
+import threading
+import subprocess
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+
+SAMPLE_RATE = 16000
+SAMPLE_WIDTH = 2  # 16-bit PCM
+FRAME_MS = 30
+FRAME_BYTES = SAMPLE_RATE * SAMPLE_WIDTH * FRAME_MS // 1000
+BYTES_PER_SECOND = SAMPLE_RATE * SAMPLE_WIDTH
+
+
+class TranscriptionError(Exception):
+    """Audio could not be transcribed at all, as opposed to containing no speech."""
+
+
+def ffmpeg_exe():
+    # moviepy ships a static ffmpeg through imageio_ffmpeg; fall back to the system one
+    try:
+        import imageio_ffmpeg
+        return imageio_ffmpeg.get_ffmpeg_exe()
+    except Exception:
+        return os.getenv("FFMPEG_BINARY", "ffmpeg")
+
+
+def stream_pcm(video_path, frame_bytes=FRAME_BYTES):
+    """Decode the audio track of video_path and yield it as fixed-size mono 16kHz PCM frames.
+
+    Audio is piped out of ffmpeg, so only one frame is held in memory at a time.
+    Raises TranscriptionError if ffmpeg is missing or fails to decode the file.
+    """
+    cmd = [
+        ffmpeg_exe(), "-nostdin", "-loglevel", "error",
+        "-i", video_path,
+        "-vn", "-ac", "1", "-ar", str(SAMPLE_RATE),
+        "-f", "s16le", "-"
+    ]
+    try:
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    except OSError as e:
+        raise TranscriptionError(f"Could not run ffmpeg: {e}")
+    try:
+        while True:
+            frame = proc.stdout.read(frame_bytes)
+            if not frame:
+                break
+            yield frame
+        if proc.wait() != 0:
+            raise TranscriptionError(f"ffmpeg exited with status {proc.returncode} decoding {video_path}")
+    finally:
+        proc.stdout.close()
+        if proc.poll() is None:
+            proc.kill()
+        proc.wait()
+
+
+def read_pcm(pcm_path, frame_bytes=FRAME_BYTES):
+    """Yield frames from a raw mono 16kHz PCM file, e.g. one written by the transcode stage."""
+    with open(pcm_path, "rb") as f:
+        while True:
+            frame = f.read(frame_bytes)
+            if not frame:
+                break
+            yield frame
+
+
+def frame_rms(frame):
+    samples = array("h", frame[:len(frame) - len(frame) % SAMPLE_WIDTH])
+    if not samples:
+        return 0
+    return math.sqrt(sum(s * s for s in samples) / len(samples))
+
+
+def split_on_silence(frames, threshold=500, min_silence_ms=500, min_chunk_s=1, max_chunk_s=30):
+    """Group PCM frames into voice-bounded chunks.
+
+    A chunk is closed after `min_silence_ms` of silence (once it is at least
+    `min_chunk_s` long) or when it reaches `max_chunk_s`. Chunks that contain
+    no voiced frames are dropped. Yields (start_seconds, pcm_bytes).
+    """
+    chunk = bytearray()
+    offset = 0
+    silence_ms = 0
+    voiced = False
+
+    for frame in frames:
+        chunk += frame
+        if frame_rms(frame) >= threshold:
+            voiced = True
+            silence_ms = 0
+        else:
+            silence_ms += FRAME_MS
+
+        duration = len(chunk) / BYTES_PER_SECOND
+        if (silence_ms >= min_silence_ms and duration >= min_chunk_s) or duration >= max_chunk_s:
+            if voiced:
+                yield offset / BYTES_PER_SECOND, bytes(chunk)
+            offset += len(chunk)
+            chunk = bytearray()
+            silence_ms = 0
+            voiced = False
+
+    if chunk and voiced:
+        yield offset / BYTES_PER_SECOND, bytes(chunk)
+
+
+def _speech_recognition():
+    # Imported on first use so processes that never transcribe don't load it
+    import speech_recognition
+    return speech_recognition
+
+
+def google_backend(audio):
+    return _speech_recognition().Recognizer().recognize_google(audio)
+
+
+def sphinx_backend(audio):
+    # Offline recognition; requires pocketsphinx to be installed
+    return _speech_recognition().Recognizer().recognize_sphinx(audio)
+
+
+BACKENDS = {
+    "google": google_backend,
+    "sphinx": sphinx_backend
+}
+
+
+class ChunkedTranscriber:
+    """Transcribes a video by streaming its audio, splitting on silence and recognizing chunks in parallel.
+
+    `backend` is a name from BACKENDS or any callable taking a
+    speech_recognition AudioData and returning text. A chunk the backend
+    can't make out counts as silence; any other backend error (network,
+    quota, missing dependency) fails that chunk, and if every chunk fails
+    transcribe() raises TranscriptionError.
+    """
+
+    def __init__(self, backend="google", max_workers=4):
+        self.backend = BACKENDS[backend] if isinstance(backend, str) else backend
+        self.max_workers = max_workers
+
+    def _recognize(self, start, pcm):
+        sr = _speech_recognition()
+        audio = sr.AudioData(pcm, SAMPLE_RATE, SAMPLE_WIDTH)
+        try:
+            text = self.backend(audio)
+        except sr.UnknownValueError:
+            text = ""
+        return {
+            "start": round(start, 2),
+            "end": round(start + len(pcm) / BYTES_PER_SECOND, 2),
+            "text": text
+        }
+
+    def transcribe(self, video_path, pcm_path=None):
+        """Return {"text": <full transcript>, "segments": [{"start", "end", "text"}, ...], "failed_chunks": n}.
+
+        If `pcm_path` points at already-extracted PCM audio it is read
+        directly instead of decoding video_path again. Raises
+        TranscriptionError if the audio can't be decoded or no chunk could
+        be recognized.
+        """
+        frames = read_pcm(pcm_path) if pcm_path else stream_pcm(video_path)
+        # Cap the number of chunks waiting in memory for a free worker
+        in_flight = threading.BoundedSemaphore(self.max_workers * 2)
+        futures = []
+
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="transcribe") as executor:
+            for start, pcm in split_on_silence(frames):
+                in_flight.acquire()
+                future = executor.submit(self._recognize, start, pcm)
+                future.add_done_callback(lambda _: in_flight.release())
+                futures.append(future)
+
+        segments = []
+        errors = []
+        for future in futures:
+            try:
+                segments.append(future.result())
+            except Exception as e:
+                errors.append(e)
+        if errors:
+            print(f"Error transcribing {len(errors)} of {len(futures)} audio chunks: {errors[0]}")
+            if len(errors) == len(futures):
+                raise TranscriptionError(f"All {len(futures)} audio chunks failed: {errors[0]}")
+
+        segments = [s for s in segments if s["text"]]
+        return {
+            "text": " ".join(s["text"] for s in segments),
+            "segments": segments,
+            "failed_chunks": len(errors)
+        }
@@ -0,0 +1,131 @@
+import time
+import atexit
+import threading
+from collections import OrderedDict
+
+
+class WriteBehindBuffer:
+    """Collects rows and writes them in bulk from a background thread.
+
+    add(target, row) returns immediately; rows are grouped by `target` and
+    handed to `write_many(target, rows)`, at most `max_batch` rows per call,
+    once `max_batch` rows are waiting or `flush_interval` seconds have
+    passed. A failed batch (and the rest of its target's rows) is put back and
+    retried on the next flush, up to `max_pending` rows in total, after
+    which the oldest rows are dropped. Everything still buffered is flushed
+    at interpreter exit; rows added after close() are written synchronously.
+    """
+
+    def __init__(self, write_many, max_batch=100, flush_interval=2.0, max_pending=10000, name="write-behind"):
+        self.write_many = write_many
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.name = name
+        self._pending = OrderedDict()  # target -> [rows]
+        self._count = 0
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+        self._closed = False
+        self.written = 0
+        self.batches = 0
+        self.failures = 0
+        self.dropped = 0
+        atexit.register(self.close)
+
+    def add(self, target, row):
+        with self._cond:
+            if not self._closed:
+                self._pending.setdefault(target, []).append(row)
+                self._count += 1
+                self._trim()
+                self._ensure_thread()
+                if self._count >= self.max_batch:
+                    self._cond.notify()
+                return
+        self.write_many(target, [row])
+
+    def flush(self):
+        """Write everything buffered so far. Returns the number of rows written."""
+        with self._flush_lock:
+            with self._cond:
+                batches = list(self._pending.items())
+                self._pending.clear()
+                self._count = 0
+
+            written = 0
+            for target, rows in batches:
+                # A backlog built up during an outage must not go out as one oversized request
+                for start in range(0, len(rows), self.max_batch):
+                    batch = rows[start:start + self.max_batch]
+                    try:
+                        self.write_many(target, batch)
+                    except Exception as e:
+                        print(f"Error flushing {len(batch)} buffered rows to {target}: {e}")
+                        unwritten = rows[start:]
+                        with self._cond:
+                            self.failures += 1
+                            self._pending.setdefault(target, [])[:0] = unwritten
+                            self._count += len(unwritten)
+                            self._trim()
+                        break
+                    written += len(batch)
+                    with self._cond:
+                        self.written += len(batch)
+                        self.batches += 1
+            return written
+
+    def close(self):
+        """Stop buffering and flush what is left; called automatically at exit."""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify()
+        self.flush()
+
+    def stats(self):
+        with self._cond:
+            return {
+                "pending": self._count,
+                "written": self.written,
+                "batches": self.batches,
+                "failures": self.failures,
+                "dropped": self.dropped
+            }
+
+    def _trim(self):
+        # Bound memory if the backing store is down for a long time
+        while self._count > self.max_pending:
+            target, rows = next(iter(self._pending.items()))
+            rows.pop(0)
+            if not rows:
+                del self._pending[target]
+            self._count -= 1
+            self.dropped += 1
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                deadline = time.monotonic() + self.flush_interval
+                while not self._closed and self._count < self.max_batch:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                if self._closed:
+                    return
+                if not self._count:
+                    continue
+                failures = self.failures
+            self.flush()
+            with self._cond:
+                if self.failures > failures and not self._closed:
+                    # Back off instead of retrying a failing store in a tight loop
+                    self._cond.wait(self.flush_interval)